@@ -4,6 +4,28 @@ import curses
 from datetime import datetime
 import argparse
 import shutil
+import hashlib
+import pickle
+import tempfile
+import io
+import json
+import zlib
+import difflib
+import re
+import csv
+import math
+import time
+import functools
+import cProfile
+import textwrap
+from array import array
+from bisect import bisect_left, bisect_right
+
+# numpy makes table queries faster but is optional
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # Path to Angband's monster data file
 ANGBAND_MONSTER_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'lib/gamedata/monster.txt')
@@ -12,9 +34,22 @@ ANGBAND_MONSTER_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirn
 BLOW_EFFECTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'lib/gamedata/blow_effects.txt')
 BLOW_METHODS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'lib/gamedata/blow_methods.txt')
 
+# Saves keep a backup of monster.txt here, stored once per distinct record
+BACKUP_DIR = os.path.join(os.path.dirname(ANGBAND_MONSTER_FILE), '.monster_backups')
+
+# Number of backups kept; older ones are removed when a new one is made
+BACKUP_RETENTION = 50
+
+# Parsed monsters are cached next to monster.txt; bump the version whenever
+# the parser's output changes so old caches are ignored
+PARSE_CACHE_VERSION = 4
+
 # Track modified monsters
 modified_monsters = set()
 
+# Problems found in monster.txt when it was loaded, reported once per run
+load_warnings = []
+
 def get_yes_no(window, prompt, highlight_color):
     """Handle yes/no confirmation prompts."""
     window.erase()
@@ -27,6 +62,9 @@ def get_yes_no(window, prompt, highlight_color):
         if key in (ord('n'), ord('N'), 27):  # 27 is ESC
             return False
 
+# Keys that move a whole page or to either end of a list
+PAGE_KEYS = (curses.KEY_NPAGE, curses.KEY_PPAGE, curses.KEY_HOME, curses.KEY_END, ord('g'), ord('G'))
+
 def navigate_list(current_pos, key, items, offset=None, list_height=None):
     """Handle list navigation with optional scrolling."""
     new_pos = current_pos
@@ -40,9 +78,46 @@ def navigate_list(current_pos, key, items, offset=None, list_height=None):
         new_pos -= 1
         if offset is not None and new_pos < offset:
             new_offset = offset - 1
+    elif key in PAGE_KEYS and items:
+        page = list_height or 1
+        if key == curses.KEY_NPAGE:
+            new_pos = min(len(items) - 1, current_pos + page)
+        elif key == curses.KEY_PPAGE:
+            new_pos = max(0, current_pos - page)
+        elif key in (curses.KEY_HOME, ord('g')):
+            new_pos = 0
+        else:
+            new_pos = len(items) - 1
+        if offset is not None and list_height:
+            # Keep the selection on the same screen row when paging
+            new_offset = max(0, min(offset + new_pos - current_pos, len(items) - list_height))
+            new_offset = min(new_pos, max(new_offset, new_pos - list_height + 1))
 
     return new_pos, new_offset
 
+class WindowRows:
+    """Remembers the text on each row of a window, so redrawing it only
+    touches the rows that changed instead of clearing the whole window."""
+
+    def __init__(self, window):
+        self.window = window
+        self.rows = {}
+
+    def draw(self, y, text, attr=0):
+        """Show text on row y, unless it is already there."""
+        if self.rows.get(y) == (text, attr):
+            return
+        self.rows[y] = (text, attr)
+        self.window.move(y, 0)
+        self.window.clrtoeol()
+        if text:
+            safe_addstr(self.window, y, 0, text, attr)
+
+    def invalidate(self):
+        """Forget what is shown, after something else drew over the window."""
+        self.rows = {}
+        self.window.erase()
+
 def handle_menu_input(key, valid_keys):
     """Handle menu key input with validation."""
     if chr(key).lower() in valid_keys:
@@ -113,61 +188,597 @@ def handle_input_editing(status_win, width, initial_value="", prompt=""):
     
     return result
 
-def parse_monster_file():
-    monsters = []
-    with open(ANGBAND_MONSTER_FILE, 'r') as file:
-        lines = file.readlines()[240:]
-        current_monster = {}
-        
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-                
-            if line.startswith('name:'):
-                if current_monster and 'name' in current_monster:
-                    monsters.append(current_monster)
-                current_monster = {'name': line[5:].strip()}
-            elif line.startswith('hit-points:') and current_monster:
-                current_monster['health'] = int(line[11:].strip())
-            elif line.startswith('speed:') and current_monster:
-                current_monster['speed'] = int(line[6:].strip())
-            elif line.startswith('experience:') and current_monster:
-                current_monster['experience'] = int(line[11:].strip())
-            elif line.startswith('blow:') and current_monster:
-                if 'blows' not in current_monster:
-                    current_monster['blows'] = []
-                current_monster['blows'].append(line[5:].strip())
-            elif line.startswith('flags:') and current_monster:
-                if 'flags' not in current_monster:
-                    current_monster['flags'] = []
-                current_monster['flags'].append(line[6:].strip())
-            elif line.startswith('flags-off:') and current_monster:
-                current_monster['flags_off'] = line[10:].strip()
-            elif line.startswith('desc:') and current_monster:
-                current_monster['description'] = line[5:].strip()
-            elif line.startswith('spell-power:') and current_monster:
-                current_monster['spell_power'] = int(line[12:].strip())
-            elif line.startswith('rarity:') and current_monster:
-                current_monster['rarity'] = int(line[7:].strip())
-                
-        # Add the last monster
-        if current_monster and 'name' in current_monster:
-            if 'health' not in current_monster:
-                current_monster['health'] = 1
-            if 'damage' not in current_monster:
-                current_monster['damage'] = 0
-            monsters.append(current_monster)
-                
+def parse_cache_path(path):
+    """Return the parse cache file that belongs to a monster file."""
+    return os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.cache')
+
+def file_stamp(path):
+    """Return (size, mtime_ns, sha1) identifying the current contents of a file."""
+    stat = os.stat(path)
+    with open(path, 'rb') as file:
+        digest = hashlib.sha1(file.read()).hexdigest()
+    return stat.st_size, stat.st_mtime_ns, digest
+
+def load_parse_cache(path):
+    """Return the cached monsters for path, or None if the cache is missing or stale."""
+    try:
+        with open(parse_cache_path(path), 'rb') as file:
+            version, stamp, monsters = pickle.load(file)
+        if version != PARSE_CACHE_VERSION:
+            return None
+        # Compare size first so a changed file is usually caught without hashing
+        if stamp[0] != os.stat(path).st_size or stamp != file_stamp(path):
+            return None
+        return monsters
+    except (OSError, EOFError, AttributeError, ValueError, TypeError, pickle.UnpicklingError):
+        return None
+
+def save_parse_cache(path, monsters):
+    """Write the parse cache for path; failing to write it is not an error."""
+    cache_path = parse_cache_path(path)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), prefix='.monster_cache')
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump((PARSE_CACHE_VERSION, file_stamp(path), monsters), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except (OSError, NameError):
+            pass
+
+def invalidate_parse_cache(path):
+    """Remove the parse cache for path, so the next launch parses the file and writes a new one."""
+    try:
+        os.unlink(parse_cache_path(path))
+    except OSError:
+        pass
+
+def parse_monster_file(path=None, use_cache=True):
+    """Parse monster.txt, reusing the on-disk parse cache while the file is unchanged."""
+    path = path or ANGBAND_MONSTER_FILE
+    monsters = load_parse_cache(path) if use_cache else None
+    if monsters is None:
+        monsters = read_monster_file(path)
+        if use_cache:
+            save_parse_cache(path, monsters)
+    check_loaded_monsters(monsters)
     return monsters
 
-def search_monsters(search_term):
-    monsters = parse_monster_file()
-    results = [monster for monster in monsters if search_term.lower() in monster['name'].lower()]
-    if results:
+# Directives with a numeric value that the editor shows as monster attributes
+INT_FIELDS = {
+    'hit-points': 'health',
+    'speed': 'speed',
+    'experience': 'experience',
+    'spell-power': 'spell_power',
+    'rarity': 'rarity',
+}
+
+def iter_monster_lines(file):
+    """Yield (line number, start, end, directive, value) for every line of a binary file.
+
+    start and end are the byte offsets of the line. Comments and blank lines
+    come through with a directive of None and the whole line as the value."""
+    offset = 0
+    for line_no, raw in enumerate(file, 1):
+        start = offset
+        offset += len(raw)
+        line = raw.decode('utf-8').rstrip('\r\n')
+        directive, sep, value = line.partition(':')
+        if not sep or not line.strip() or line.lstrip().startswith('#'):
+            yield line_no, start, offset, None, line
+        else:
+            yield line_no, start, offset, directive.strip(), value
+
+class Blow:
+    """One blow: line of a monster record, METHOD[:EFFECT[:DICE]].
+
+    Blows are parsed once, when the record is read, and written back with
+    str(). Effect and dice are None for blows like BEG that don't have them."""
+    __slots__ = ('method', 'effect', 'dice')
+
+    def __init__(self, method, effect=None, dice=None):
+        self.method = method
+        self.effect = effect or None
+        self.dice = dice or None
+
+    @classmethod
+    def parse(cls, text):
+        """Read a blow in the file's colon form, or the editor's 'method effect damage' form."""
+        text = text.strip()
+        if ':' in text:
+            return cls(*(part.strip() for part in text.split(':', 2)))
+        parts = text.split()
+        if not parts:
+            raise ValueError("empty blow")
+        return cls(*[part.upper() for part in parts[:2]] + parts[2:3])
+
+    def validate(self):
+        """Return the blow with its method and effect named as in the gamedata files.
+
+        Raises ValueError if either is unknown."""
+        method, effect = gamedata.check_blow(self.method, self.effect)
+        return Blow(method, effect, self.dice)
+
+    def matches(self, other):
+        """Whether this blow is other, or starts with it, e.g. BITE or BITE:POISON."""
+        return all(b is None or (a or '').upper() == b.upper()
+                   for a, b in ((self.method, other.method), (self.effect, other.effect), (self.dice, other.dice)))
+
+    def __str__(self):
+        return ':'.join(part for part in (self.method, self.effect, self.dice) if part)
+
+    def __repr__(self):
+        return f"Blow({str(self)!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Blow):
+            return NotImplemented
+        return (self.method, self.effect, self.dice) == (other.method, other.effect, other.dice)
+
+    def __hash__(self):
+        return hash((self.method, self.effect, self.dice))
+
+# Parsed flag sets by the flags lines they were read from, so monsters with
+# the same flags share one frozenset and no line is split twice
+flag_sets = {}
+
+def monster_flags(monster):
+    """Return the flags of a monster as a frozenset, from all of its flags lines."""
+    lines = tuple(monster.get('flags', ()))
+    flags = flag_sets.get(lines)
+    if flags is None:
+        flags = flag_sets[lines] = frozenset(
+            sys.intern(flag) for line in lines for flag in re.split(r'[|\s]+', line) if flag)
+    return flags
+
+def apply_directive(monster, directive, value):
+    """Update the editor's attributes of a monster from one of its directive lines."""
+    if directive in INT_FIELDS:
+        monster[INT_FIELDS[directive]] = int(value.strip())
+    elif directive == 'blow':
+        monster.setdefault('blows', []).append(Blow.parse(value))
+    elif directive == 'flags':
+        monster.setdefault('flags', []).append(value.strip())
+    elif directive == 'flags-off':
+        monster['flags_off'] = value.strip()
+    elif directive == 'desc':
+        # Description lines are concatenated as they are, as the game does
+        if 'description' in monster:
+            monster['description'] += value
+        else:
+            monster['description'] = value.lstrip()
+
+def parse_monster_records(file):
+    """Yield the monsters in a binary file object one at a time, in file order.
+
+    Each monster keeps every line of its record in 'fields' as
+    (line offset in the record, directive, value) tuples, alongside the
+    attributes the editor works with. 'line' is the line number of its name:
+    line and 'span' the byte range of the record in the file. Comments and
+    blank lines between records, and everything before the first name: line,
+    belong to no record."""
+    monster = None
+    # Comments and blank lines only belong to the record if another
+    # directive of it follows them
+    pending = []
+    for line_no, start, end, directive, value in iter_monster_lines(file):
+        if directive == 'name':
+            if monster is not None:
+                yield monster
+            monster = {'name': value.strip(), 'line': line_no, 'span': (start, end), 'fields': []}
+            pending = []
+        if monster is None:
+            continue
+        if directive is None:
+            pending.append((line_no - monster['line'], None, value))
+            continue
+        monster['fields'].extend(pending)
+        pending = []
+        monster['fields'].append((line_no - monster['line'], directive, value))
+        monster['span'] = (monster['span'][0], end)
+        apply_directive(monster, directive, value)
+
+    if monster is not None:
+        yield monster
+
+def iter_monster_records(path):
+    """Yield the monsters in path one at a time, reading the file lazily."""
+    with open(path, 'rb') as file:
+        yield from parse_monster_records(file)
+
+def read_monster_file(path):
+    """Parse the monster records in path without any caching."""
+    return list(iter_monster_records(path))
+
+def get_field(monster, directive, default=None):
+    """Return the value of the first directive line of a monster, e.g. 'depth'."""
+    for _, name, value in monster.get('fields', ()):
+        if name == directive:
+            return value.strip()
+    return default
+
+def get_field_values(monster, directive):
+    """Return the values of all of a monster's directive lines, e.g. 'spells'."""
+    return [value.strip() for _, name, value in monster.get('fields', ()) if name == directive]
+
+class MonsterIndex:
+    """Name index over the parsed monsters, built once and shared by the UI and search.
+
+    Lookups return the monster dicts themselves, so edits made through search
+    results are the ones save_all_changes writes back. flags is a FlagIndex
+    over the same monsters."""
+
+    def __init__(self, monsters):
+        self.monsters = monsters
+        self.rebuild()
+        self.flags = FlagIndex(monsters)
+
+    def rebuild(self):
+        """Recompute the lowercase key tables after monsters were added or renamed."""
+        keys = [monster['name'].lower() for monster in self.monsters]
+        # All keys joined into one string, so a substring search is a few
+        # str.find calls instead of a Python loop over every name
+        self.offsets = []
+        position = 0
+        for key in keys:
+            self.offsets.append(position)
+            position += len(key) + 1
+        self.blob = '\n'.join(keys)
+        # Sorted (key, row) pairs for prefix lookups by bisection
+        self.sorted_keys = sorted(zip(keys, range(len(keys))))
+        self.by_name = {}
+        for key, monster in zip(keys, self.monsters):
+            self.by_name.setdefault(key, monster)
+
+    def get(self, name):
+        """Return the monster with this name (case-insensitive), or None."""
+        return self.by_name.get(name.lower())
+
+    def prefix(self, term):
+        """Return the monsters whose names start with term, in file order."""
+        term = term.lower()
+        start = bisect_left(self.sorted_keys, (term,))
+        end = bisect_left(self.sorted_keys, (term + '\U0010ffff',), start)
+        rows = sorted(row for _, row in self.sorted_keys[start:end])
+        return [self.monsters[row] for row in rows]
+
+    def search(self, term):
+        """Return the monsters whose names contain term, in file order."""
+        term = term.lower()
+        if not term:
+            return list(self.monsters)
+        results = []
+        position = self.blob.find(term)
+        while position != -1:
+            row = bisect_right(self.offsets, position) - 1
+            results.append(self.monsters[row])
+            # Skip to the next name so a name matching twice is listed once
+            if row + 1 == len(self.offsets):
+                break
+            position = self.blob.find(term, self.offsets[row + 1])
         return results
-    else:
-        return []
+
+    def narrow(self, results, term):
+        """Filter earlier results for a shorter term down to those matching term.
+
+        Every name containing term also contains any substring of it, so this
+        only has to look at the previous results, not all monsters."""
+        term = term.lower()
+        return [monster for monster in results if term in monster['name'].lower()]
+
+class FlagIndex:
+    """Inverted index from each flag to the set of monsters that have it.
+
+    A set of monsters is an int with bit n set for the monster in row n, so
+    flag queries like UNIQUE and not NEVER_MOVE are a few bitwise operations
+    on whole sets instead of a scan of every monster's flags lines."""
+
+    def __init__(self, monsters):
+        self.monsters = monsters
+        self.rows = {id(monster): row for row, monster in enumerate(monsters)}
+        self.all = (1 << len(monsters)) - 1
+        self.bits = {}
+        self.flags = []
+        for row, monster in enumerate(monsters):
+            flags = monster_flags(monster)
+            self.flags.append(flags)
+            for flag in flags:
+                self.bits[flag] = self.bits.get(flag, 0) | (1 << row)
+
+    def update(self, monster):
+        """Move a monster between flag sets after its flags were edited."""
+        row = self.rows.get(id(monster))
+        if row is None:
+            return
+        old, new = self.flags[row], monster_flags(monster)
+        bit = 1 << row
+        for flag in old - new:
+            self.bits[flag] &= ~bit
+        for flag in new - old:
+            self.bits[flag] = self.bits.get(flag, 0) | bit
+        self.flags[row] = new
+
+    def select(self, bits):
+        """Return the monsters in a set, in file order."""
+        # Reading the bits from one binary string is linear in the number of
+        # monsters; clearing them one at a time would copy the int each time
+        digits = bin(bits)[:1:-1]
+        monsters = []
+        row = digits.find('1')
+        while row != -1:
+            monsters.append(self.monsters[row])
+            row = digits.find('1', row + 1)
+        return monsters
+
+    def evaluate(self, text):
+        """Return the set of monsters matching a query like UNIQUE or (EVIL and not NEVER_MOVE).
+
+        Flags combine with and, or, not and parentheses; not binds tightest, then and.
+        A flag no monster has matches none of them, so not FLAG matches all."""
+        tokens = re.findall(r'[()]|[^\s()]+', text)
+        position = 0
+
+        def peek():
+            return tokens[position].lower() if position < len(tokens) else None
+
+        def take():
+            nonlocal position
+            if position == len(tokens):
+                raise ValueError(f"unexpected end of flag query {text!r}")
+            position += 1
+            return tokens[position - 1]
+
+        def expression():
+            bits = term()
+            while peek() == 'or':
+                take()
+                bits |= term()
+            return bits
+
+        def term():
+            bits = factor()
+            while peek() == 'and':
+                take()
+                bits &= factor()
+            return bits
+
+        def factor():
+            token = take()
+            if token.lower() == 'not':
+                return self.all & ~factor()
+            if token == '(':
+                bits = expression()
+                if take() != ')':
+                    raise ValueError(f"missing ) in flag query {text!r}")
+                return bits
+            if token == ')' or token.lower() in ('and', 'or'):
+                raise ValueError(f"unexpected {token!r} in flag query {text!r}")
+            flag = token.upper()
+            if not re.fullmatch(r'[A-Z0-9_]+', flag):
+                raise ValueError(f"{token!r} is not a flag name in flag query {text!r}")
+            return self.bits.get(flag, 0)
+
+        if not tokens:
+            return self.all
+        bits = expression()
+        if position != len(tokens):
+            raise ValueError(f"unexpected {tokens[position]!r} in flag query {text!r}")
+        return bits
+
+    def query(self, text):
+        """Return the monsters matching a flag query, in file order."""
+        return self.select(self.evaluate(text))
+
+# Shared index, built on first use
+monster_index = None
+
+def get_monster_index():
+    """Return the shared monster index, parsing monster.txt the first time."""
+    global monster_index
+    if monster_index is None:
+        monster_index = MonsterIndex(parse_monster_file())
+    return monster_index
+
+def search_monsters(search_term):
+    return get_monster_index().search(search_term)
+
+# Numeric columns of the monster table: editor attributes and record directives
+TABLE_COLUMNS = ('speed', 'health', 'experience', 'spell_power', 'rarity', 'depth', 'power')
+
+# Other names the columns can be given in queries
+TABLE_ALIASES = {'hit-points': 'health', 'hp': 'health', 'spell-power': 'spell_power', 'exp': 'experience'}
+
+TABLE_OPERATORS = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '=': lambda a, b: a == b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+TABLE_QUERY = re.compile(r'''
+    ^(?P<where>.*?)
+    (?:\s*\bsort\s+by\s+(?P<sort>[\w-]+)(?:\s+(?P<order>asc|desc))?)?
+    (?:\s*\blimit\s+(?P<limit>\d+))?\s*$''', re.IGNORECASE | re.VERBOSE)
+
+TABLE_CONDITION = re.compile(r'^\s*([\w-]+)\s*(<=|>=|==|!=|<|>|=)\s*(-?\d+(?:\.\d+)?)\s*$')
+
+def table_column(name):
+    """Return the table column a query refers to."""
+    column = TABLE_ALIASES.get(name.lower(), name.lower())
+    if column not in TABLE_COLUMNS:
+        raise ValueError(f"unknown column {name!r}, expected one of {', '.join(TABLE_COLUMNS)}")
+    return column
+
+class MonsterTable:
+    """Numeric monster attributes stored column by column.
+
+    Each column is a numpy array when numpy is installed, or else an
+    array('d'), with NaN where a monster lacks the attribute. Queries work on
+    whole columns instead of on each monster's dict, and rows map back to the
+    monster dicts, so results can be edited and saved like any other."""
+
+    def __init__(self, monsters):
+        self.monsters = monsters
+        self.rows = {monster['name']: row for row, monster in enumerate(monsters)}
+        self.columns = {}
+        for column in TABLE_COLUMNS:
+            values = [self.value(monster, column) for monster in monsters]
+            self.columns[column] = numpy.array(values, dtype=float) if numpy else array('d', values)
+
+    @staticmethod
+    def value(monster, column):
+        value = monster.get(column)
+        if value is None:
+            value = get_field(monster, column)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return math.nan
+
+    def update(self, monster):
+        """Refresh a monster's row after it was edited."""
+        row = self.rows.get(monster['name'])
+        if row is not None:
+            for column in TABLE_COLUMNS:
+                self.columns[column][row] = self.value(monster, column)
+
+    def filter(self, conditions, rows=None):
+        """Return the rows matching every (column, operator, value) condition, in file order."""
+        if numpy:
+            mask = numpy.ones(len(self.monsters), dtype=bool)
+            for column, op, value in conditions:
+                values = self.columns[column]
+                # Comparisons with NaN are false, except !=
+                mask &= TABLE_OPERATORS[op](values, value) & ~numpy.isnan(values)
+            matches = numpy.flatnonzero(mask)
+            return matches if rows is None else numpy.intersect1d(matches, rows)
+        rows = range(len(self.monsters)) if rows is None else rows
+        for column, op, value in conditions:
+            values = self.columns[column]
+            compare = TABLE_OPERATORS[op]
+            rows = [row for row in rows if compare(values[row], value) and not math.isnan(values[row])]
+        return list(rows)
+
+    def sort(self, rows, column, descending=False):
+        """Return rows ordered by a column, with monsters lacking it last."""
+        values = self.columns[column]
+        if numpy:
+            rows = numpy.asarray(rows, dtype=int)
+            keys = values[rows]
+            order = numpy.argsort(-keys if descending else keys, kind='stable')
+            return rows[order]
+        sign = -1 if descending else 1
+        return sorted(rows, key=lambda row: (math.isnan(values[row]), sign * values[row]))
+
+    def aggregate(self, column, by=None, rows=None):
+        """Return count, min, max and mean of a column, as one group or per value of another column."""
+        values = self.columns[column]
+        groups = self.columns[by] if by else None
+        if numpy:
+            rows = numpy.arange(len(self.monsters)) if rows is None else numpy.asarray(rows, dtype=int)
+            selected = values[rows]
+            keys = groups[rows] if by else numpy.zeros(len(rows))
+            valid = ~numpy.isnan(selected) & ~numpy.isnan(keys)
+            selected, keys = selected[valid], keys[valid]
+            if not len(selected):
+                return []
+            order = numpy.argsort(keys, kind='stable')
+            selected, keys = selected[order], keys[order]
+            unique, starts, counts = numpy.unique(keys, return_index=True, return_counts=True)
+            sums = numpy.add.reduceat(selected, starts)
+            return [{'group': float(key) if by else None, 'count': int(count), 'min': float(low),
+                     'max': float(high), 'mean': float(total / count)}
+                    for key, count, low, high, total in zip(
+                        unique, counts, numpy.minimum.reduceat(selected, starts),
+                        numpy.maximum.reduceat(selected, starts), sums)]
+        stats = {}
+        for row in range(len(self.monsters)) if rows is None else rows:
+            value = values[row]
+            key = groups[row] if by else None
+            if math.isnan(value) or (by and math.isnan(key)):
+                continue
+            group = stats.setdefault(key, [0, value, value, 0.0])
+            group[0] += 1
+            group[1] = min(group[1], value)
+            group[2] = max(group[2], value)
+            group[3] += value
+        return [{'group': key, 'count': count, 'min': low, 'max': high, 'mean': total / count}
+                for key, (count, low, high, total) in sorted(stats.items(), key=lambda item: item[0] or 0)]
+
+    def query(self, text):
+        """Run a query like 'speed > 120 and hit-points > 500 sort by speed desc limit 20'.
+
+        Returns the matching monsters and the columns the query used."""
+        match = TABLE_QUERY.match(text)
+        conditions = []
+        used = []
+        where = match['where'].strip()
+        if where:
+            for part in re.split(r'\s+and\s+', where, flags=re.IGNORECASE):
+                condition = TABLE_CONDITION.match(part)
+                if not condition:
+                    raise ValueError(f"expected COLUMN OP NUMBER, not {part.strip()!r}")
+                column = table_column(condition[1])
+                conditions.append((column, condition[2], float(condition[3])))
+                used.append(column)
+        rows = self.filter(conditions)
+        if match['sort']:
+            column = table_column(match['sort'])
+            rows = self.sort(rows, column, (match['order'] or '').lower() == 'desc')
+            used.append(column)
+        if match['limit']:
+            rows = rows[:int(match['limit'])]
+        return [self.monsters[row] for row in rows], list(dict.fromkeys(used))
+
+# Shared table, built on first use from the monster index
+monster_table = None
+
+def get_monster_table():
+    """Return the shared monster table, building it the first time."""
+    global monster_table
+    if monster_table is None:
+        monster_table = MonsterTable(get_monster_index().monsters)
+    return monster_table
+
+def format_number(value):
+    if math.isnan(value):
+        return '-'
+    return str(int(value)) if value == int(value) else f"{value:.1f}"
+
+def print_query(text):
+    """Print the monsters matching a table query, with the columns it used."""
+    table = get_monster_table()
+    monsters, columns = table.query(text)
+    columns = columns or ['speed', 'health', 'depth']
+    print(f"{'name':30}" + ''.join(f"{column:>12}" for column in columns))
+    for monster in monsters:
+        row = table.rows[monster['name']]
+        print(f"{monster['name'][:30]:30}"
+              + ''.join(f"{format_number(table.columns[column][row]):>12}" for column in columns))
+    print(f"\n{len(monsters)} of {len(table.monsters)} monsters")
+
+def print_flag_query(text):
+    """Print the monsters matching a flag query like UNIQUE and not NEVER_MOVE."""
+    index = get_monster_index()
+    monsters = index.flags.query(text)
+    for monster in monsters:
+        print(monster['name'])
+    print(f"\n{len(monsters)} of {len(index.monsters)} monsters")
+
+def print_stats(column, by=None):
+    """Print count, min, max and mean of a column, optionally per value of another."""
+    table = get_monster_table()
+    column = table_column(column)
+    by = table_column(by) if by else None
+    print(f"{by or '':>8}{'count':>8}{'min':>10}{'max':>10}{'mean':>10}   {column}")
+    for group in table.aggregate(column, by):
+        label = format_number(group['group']) if by else 'all'
+        print(f"{label:>8}{group['count']:>8}{format_number(group['min']):>10}"
+              f"{format_number(group['max']):>10}{group['mean']:>10.1f}")
 
 def safe_addstr(window, y, x, text, attr=0):
     """Safely add a string to a curses window, handling encoding issues."""
@@ -260,11 +871,79 @@ def get_field_info(line):
     
     return None
 
+# Bumped whenever a monster changes, so its cached detail content is rebuilt
+monster_versions = {}
+
+# Detail content of each (monster name, width): (version, content lines, rows, pad)
+detail_cache = {}
+
+def mark_monster_changed(monster):
+    """Record that a monster changed, so its cached detail content is rebuilt."""
+    monster_versions[monster['name']] = monster_versions.get(monster['name'], 0) + 1
+
+def wrap_content_line(line, width):
+    """Lay out one line of detail content on rows of the given width.
+
+    Returns a list with the (x, text, attr) pieces of each row. Text too long
+    for one row wraps onto the next ones, indented to where it started."""
+    if len(line) == 2:
+        text, attr = line
+        if len(text) <= width:
+            return [[(0, text, attr)]]
+        # Wrapped flags lines continue under the flags, not under the "- "
+        indent = len(text) - len(text.lstrip(' -'))
+        if indent >= width // 2:
+            indent = 0
+        parts = textwrap.wrap(text, width, subsequent_indent=' ' * indent) or [text[:width]]
+        return [[(0, part, attr)] for part in parts]
+    label, label_attr, value, value_attr = line
+    x = len(label) + 1
+    if x + len(value) <= width:
+        return [[(0, label, label_attr), (x, value, value_attr)]]
+    if x >= width // 2:
+        # No room beside the label; the value goes on the rows below it
+        return [[(0, label[:width], label_attr)]] + [[(0, part, value_attr)] for part in textwrap.wrap(value, width)]
+    parts = textwrap.wrap(value, width - x) or ['']
+    return [[(0, label, label_attr), (x, parts[0], value_attr)]] + [[(x, part, value_attr)] for part in parts[1:]]
+
+def draw_content_line(window, y, rows, attr_modifier=0):
+    """Draw the rows of one line of detail content from row y, replacing whatever was there."""
+    for row, pieces in enumerate(rows, y):
+        window.move(row, 0)
+        window.clrtoeol()
+        for x, text, attr in pieces:
+            safe_addstr(window, row, x, text, attr | attr_modifier)
+
+def get_monster_content(monster, width):
+    """Return the detail content lines of a monster, where they are laid out
+    and a pad with them drawn on it.
+
+    rows has a (first pad row, wrapped rows) pair for each content line. All
+    of it is kept until the monster changes, so opening its details again
+    doesn't rebuild anything and scrolling only moves a viewport over the pad."""
+    key = (monster['name'], width)
+    version = monster_versions.get(monster['name'], 0)
+    entry = detail_cache.get(key)
+    if entry is None or entry[0] != version:
+        content_lines = generate_monster_content(monster, width)
+        rows = []
+        y = 0
+        for line in content_lines:
+            wrapped = wrap_content_line(line, width - 1)
+            rows.append((y, wrapped))
+            y += len(wrapped)
+        pad = curses.newpad(y + 1, width)
+        for y, wrapped in rows:
+            draw_content_line(pad, y, wrapped)
+        entry = detail_cache[key] = (version, content_lines, rows, pad)
+    return entry[1:]
+
 def show_monster_details(win, monster, height, width):
     """Display monster details in a scrollable window."""
     # Create a status window at the bottom
     detail_win = curses.newwin(height - 3, width, 0, 0)  # Main content window
     status_win = curses.newwin(3, width, height - 3, 0)  # Status window
+    status_rows = WindowRows(status_win)
     
     # Make a copy of the monster data so we can edit it without affecting the original
     monster_copy = monster.copy()
@@ -282,76 +961,91 @@ def show_monster_details(win, monster, height, width):
         'blows': 'blows'
     }
     
-    # Prepare all the content lines first
-    content_lines = generate_monster_content(monster_copy, width)
+    # Get the content lines, rendered onto a pad
+    content_lines, rows, pad = get_monster_content(monster_copy, width)
     
     # Initialize scrolling variables
     scroll_pos = 0
-    max_scroll = max(0, len(content_lines) - (height - 5))  # -5 for borders and status
+    view_height = height - 4
     
     # Initialize selection variable
     selected_line = 3  # Start with speed selected
+    highlighted = None  # Line shown selected on the pad
     
     # Track if changes were made
     changes_made = False
+    repaint = True
+    
+    def show_message(text, attr):
+        status_rows.draw(2, text, attr)
+        status_win.refresh()
+        status_win.getch()  # Wait for keypress
+    
+    def content_changed():
+        """Pick up the content of the edited copy after a change."""
+        nonlocal content_lines, rows, pad, highlighted, selected_line
+        mark_monster_changed(monster_copy)
+        content_lines, rows, pad = get_monster_content(monster_copy, width)
+        highlighted = None
+        selected_line = min(selected_line, len(content_lines) - 1)
     
     # Main loop for scrollable view
     while True:
-        detail_win.clear()
-        status_win.clear()
+        draw_start = time.perf_counter()
+        max_scroll = max(0, rows[-1][0] + len(rows[-1][1]) - view_height)
+        scroll_pos = min(scroll_pos, max_scroll)
+        if repaint:
+            # Something else covered the screen
+            detail_win.erase()
+            detail_win.noutrefresh()
+            pad.touchwin()
+            status_rows.invalidate()
+            repaint = False
         
-        # Display visible content
-        for i in range(min(height - 4, len(content_lines) - scroll_pos)):
-            line_idx = scroll_pos + i
-            line = content_lines[line_idx]
-            
-            if line_idx == selected_line:
-                attr_modifier = curses.A_REVERSE
-            else:
-                attr_modifier = 0
-                
-            if len(line) == 2:
-                text, attr = line
-                safe_addstr(detail_win, i, 0, text, attr | attr_modifier)
-            elif len(line) == 4:
-                label, label_attr, value, value_attr = line
-                safe_addstr(detail_win, i, 0, label, label_attr | attr_modifier)
-                safe_addstr(detail_win, i, len(label) + 1, value, value_attr | attr_modifier)
+        # Move the highlight on the pad to the selected line
+        if highlighted != selected_line:
+            if highlighted is not None:
+                draw_content_line(pad, *rows[highlighted])
+            draw_content_line(pad, *rows[selected_line], curses.A_REVERSE)
+            highlighted = selected_line
         
         # Draw status window
-        safe_addstr(status_win, 0, 0, "=" * (width - 1), COLOR_DEFAULT)
-        status_text = get_status_text(content_lines[selected_line] if selected_line < len(content_lines) else None)
-        safe_addstr(status_win, 1, 0, status_text, COLOR_INFO)
+        status_rows.draw(0, "=" * (width - 1), COLOR_DEFAULT)
+        status_rows.draw(1, get_status_text(content_lines[selected_line]), COLOR_INFO)
+        status_rows.draw(2, "")
         
-        # Refresh windows
-        detail_win.refresh()
-        status_win.refresh()
+        # Show the visible part of the pad and the status together
+        pad.noutrefresh(scroll_pos, 0, 0, 0, view_height - 1, width - 1)
+        status_win.noutrefresh()
+        curses.doupdate()
+        if profiler is not None:
+            profiler.add('details', time.perf_counter() - draw_start)
         
         # Get input
-        key = detail_win.getch()
+        key = status_win.getch()
         
         if key == ord('q') or key == 27:  # q or ESC to quit
+            # Leave the cached pad without a selection
+            draw_content_line(pad, *rows[highlighted])
             if changes_made:
                 # Update the original monster and mark as modified
                 for key, value in monster_copy.items():
                     monster[key] = value
                 modified_monsters.add(monster['name'])
+                if monster_table is not None:
+                    monster_table.update(monster)
+                if monster_index is not None:
+                    monster_index.flags.update(monster)
             break
         elif key == ord('s'):  # Save changes
             if changes_made:
                 if save_monster_changes(monster, monster_copy):
-                    safe_addstr(status_win, 2, 0, "Changes saved successfully!", COLOR_HIGHLIGHT)
-                    status_win.refresh()
-                    detail_win.getch()  # Wait for keypress
+                    show_message("Changes saved successfully!", COLOR_HIGHLIGHT)
                 else:
-                    safe_addstr(status_win, 2, 0, "Error saving changes.", COLOR_IMPORTANT)
-                    status_win.refresh()
-                    detail_win.getch()  # Wait for keypress
+                    show_message("Error saving changes.", COLOR_IMPORTANT)
                 changes_made = False
             else:
-                safe_addstr(status_win, 2, 0, "No changes to save.", COLOR_INFO)
-                status_win.refresh()
-                detail_win.getch()  # Wait for keypress
+                show_message("No changes to save.", COLOR_INFO)
         # Handle navigation
         elif key in (ord('j'), ord('k')):
             new_line = selected_line
@@ -374,13 +1068,15 @@ def show_monster_details(win, monster, height, width):
                     
             if new_line != selected_line:
                 selected_line = new_line
-                # Adjust scroll position if needed
-                if selected_line >= scroll_pos + height - 4:
-                    scroll_pos = min(max_scroll, selected_line - height + 5)
-                elif selected_line < scroll_pos:
-                    scroll_pos = max(0, selected_line)
+                # Adjust scroll position so all rows of the line are shown
+                first, wrapped = rows[selected_line]
+                last = first + len(wrapped) - 1
+                if last >= scroll_pos + view_height:
+                    scroll_pos = min(max_scroll, last - view_height + 1, first)
+                elif first < scroll_pos:
+                    scroll_pos = first
         elif key == ord('e'):  # e to edit selected field
-            field_info = get_field_info(content_lines[selected_line] if selected_line < len(content_lines) else None)
+            field_info = get_field_info(content_lines[selected_line])
             if field_info:
                 field_name, field_type = field_info
                 if field_name == 'blows':
@@ -388,29 +1084,19 @@ def show_monster_details(win, monster, height, width):
                     edit_win = curses.newwin(height, width, 0, 0)
                     if edit_monster_blow(edit_win, monster_copy, height, width):
                         changes_made = True
-                        # Regenerate content lines with updated data
-                        content_lines = generate_monster_content(monster_copy, width)
+                        content_changed()
                     # Clean up the window
                     del edit_win
-                    # Redraw the main windows
-                    detail_win.clear()
-                    status_win.clear()
-                    detail_win.refresh()
-                    status_win.refresh()
+                    repaint = True
                 elif field_name == 'flags':
                     # Create a new window for the flag editor
                     edit_win = curses.newwin(height, width, 0, 0)
                     if edit_monster_flags(edit_win, monster_copy, height, width):
                         changes_made = True
-                        # Regenerate content lines with updated data
-                        content_lines = generate_monster_content(monster_copy, width)
+                        content_changed()
                     # Clean up the window
                     del edit_win
-                    # Redraw the main windows
-                    detail_win.clear()
-                    status_win.clear()
-                    detail_win.refresh()
-                    status_win.refresh()
+                    repaint = True
                 else:
                     # Handle other field editing...
                     field_key = field_to_key.get(field_name)
@@ -423,6 +1109,7 @@ def show_monster_details(win, monster, height, width):
                         initial_value=str(monster_copy.get(field_key, '')),
                         prompt=f"Edit {field_name} (Enter to confirm, ESC to cancel):"
                     )
+                    status_rows.invalidate()
                     
                     if edited_value is not None:
                         try:
@@ -434,11 +1121,9 @@ def show_monster_details(win, monster, height, width):
                                 monster_copy[field_key] = edited_value
                                 changes_made = True
                             
-                            content_lines = generate_monster_content(monster_copy, width)
+                            content_changed()
                         except ValueError:
-                            safe_addstr(status_win, 2, 0, f"Invalid input - expected {field_type}", COLOR_IMPORTANT)
-                            status_win.refresh()
-                            detail_win.getch()
+                            show_message(f"Invalid input - expected {field_type}", COLOR_IMPORTANT)
 
 def generate_monster_content(monster, width):
     """Generate content lines for monster details display."""
@@ -459,7 +1144,7 @@ def generate_monster_content(monster, width):
     content_lines.append(("Blows:", COLOR_INFO))
     if 'blows' in monster and monster['blows']:
         for blow in monster['blows']:
-            content_lines.append(("  - " + blow, COLOR_DEFAULT))
+            content_lines.append(("  - " + str(blow), COLOR_DEFAULT))
     else:
         content_lines.append(("  None", COLOR_DEFAULT))
     content_lines.append(("", COLOR_DEFAULT))  # Empty line
@@ -493,90 +1178,751 @@ def generate_monster_content(monster, width):
     
     return content_lines
 
-def save_all_changes(monsters):
-    """Save all changes to the original monster file and create a backup."""
-    # Generate backup filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_filename = f"monster_{timestamp}.txt"
-    backup_filepath = os.path.join(os.path.dirname(ANGBAND_MONSTER_FILE), backup_filename)
-    
+def attribute_lines(monster, key):
+    """Return the directive values that write out one of the editor's attributes."""
+    value = monster[key]
+    if key == 'blows':
+        return [str(blow) for blow in value]
+    if key == 'flags':
+        return list(value)
+    return [str(value)]
+
+# Editor attributes and the directive each one is written as
+ATTRIBUTE_DIRECTIVES = {key: directive for directive, key in INT_FIELDS.items()}
+ATTRIBUTE_DIRECTIVES.update(blows='blow', flags='flags', flags_off='flags-off', description='desc')
+
+def format_monster_record(monster):
+    """Serialize a monster to its lines in monster.txt.
+
+    Lines are written in their original order from 'fields'. Attributes the
+    editor changed replace the lines they were read from, attributes the record
+    did not have before are added ahead of its description, and everything
+    else is written back exactly as it was read."""
+    original = {}
+    for _, directive, value in monster['fields']:
+        if directive is not None:
+            apply_directive(original, directive, value)
+    changed = {ATTRIBUTE_DIRECTIVES[key]: key for key in ATTRIBUTE_DIRECTIVES
+               if key in monster and monster[key] != original.get(key)}
+
+    lines = []
+    written = set()
+    for _, directive, value in monster['fields']:
+        if directive is None:
+            lines.append(value)
+        elif directive not in changed:
+            lines.append(f"{directive}:{value}")
+        elif directive not in written:
+            # The first line of a changed attribute stands in for all of them
+            written.add(directive)
+            lines.extend(f"{directive}:{line}" for line in attribute_lines(monster, changed[directive]))
+
+    added = [f"{directive}:{line}" for directive, key in changed.items() if directive not in written
+             for line in attribute_lines(monster, key)]
+    if added:
+        position = len(lines)
+        for i, (_, directive, _) in enumerate(monster['fields']):
+            if directive == 'desc':
+                position = i
+                break
+        lines[position:position] = added
+    return ''.join(line + '\n' for line in lines)
+
+def write_file_atomic(path, chunks):
+    """Write chunks of bytes to path through a temp file, so a crash never leaves it half written."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path))
     try:
-        # Create backup of original file
-        shutil.copy2(ANGBAND_MONSTER_FILE, backup_filepath)
-        
-        # Read the original file to preserve comments and structure
-        with open(ANGBAND_MONSTER_FILE, 'r') as file:
-            lines = file.readlines()
-        
-        # Create a map of monster names to their data
-        monster_map = {m['name']: m for m in monsters}
-        
-        # Process the file line by line
-        new_lines = []
-        current_monster = None
-        skip_until_next = False
-        
-        for line in lines:
-            if line.startswith('name:'):
-                monster_name = line[5:].strip()
-                if monster_name in modified_monsters:
-                    # This is a modified monster - skip original entries
-                    skip_until_next = True
-                    current_monster = monster_map[monster_name]
-                    # Write the updated monster data
-                    new_lines.append(f"name:{current_monster['name']}\n")
-                    if 'speed' in current_monster:
-                        new_lines.append(f"speed:{current_monster['speed']}\n")
-                    if 'health' in current_monster:
-                        new_lines.append(f"hit-points:{current_monster['health']}\n")
-                    if 'experience' in current_monster:
-                        new_lines.append(f"experience:{current_monster['experience']}\n")
-                    if 'blows' in current_monster:
-                        for blow in current_monster['blows']:
-                            # Ensure blow is properly formatted as "blow:METHOD:EFFECT:DAMAGE"
-                            if ':' in blow:
-                                # If already in format METHOD:EFFECT:DAMAGE, just add "blow:" prefix
-                                new_lines.append(f"blow:{blow}\n")
-                            else:
-                                # If in space-separated format, convert to proper format
-                                parts = blow.split()
-                                if len(parts) >= 3:
-                                    method = parts[0].upper()
-                                    effect = parts[1].upper()
-                                    damage = parts[2]
-                                    new_lines.append(f"blow:{method}:{effect}:{damage}\n")
-                                else:
-                                    # If can't parse properly, just save as-is with "blow:" prefix
-                                    new_lines.append(f"blow:{blow}\n")
-                    if 'flags' in current_monster:
-                        for flag in current_monster['flags']:
-                            new_lines.append(f"flags:{flag}\n")
-                    if 'flags_off' in current_monster:
-                        new_lines.append(f"flags-off:{current_monster['flags_off']}\n")
-                    if 'description' in current_monster:
-                        new_lines.append(f"desc:{current_monster['description']}\n")
-                    if 'spell_power' in current_monster:
-                        new_lines.append(f"spell-power:{current_monster['spell_power']}\n")
-                    if 'rarity' in current_monster:
-                        new_lines.append(f"rarity:{current_monster['rarity']}\n")
+        with os.fdopen(fd, 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def spans_match_file(monsters, path):
+    """Check that each monster's span still points at its record in path."""
+    with open(path, 'rb') as file:
+        for monster in monsters:
+            file.seek(monster['span'][0])
+            # A record starts with its name: line if the file is as we parsed it
+            if file.readline().decode('utf-8').rstrip('\r\n') != f"name:{monster['name']}":
+                return False
+    return True
+
+def update_record_positions(monsters, changed, records):
+    """Bring spans, line numbers and fields up to date after records were rewritten.
+
+    monsters must be in file order. Records after a rewritten one move by the
+    change in its size, so nothing has to be re-read from disk."""
+    new_records = {id(monster): record for monster, record in zip(changed, records)}
+    byte_shift = line_shift = 0
+    for monster in monsters:
+        start, end = monster['span']
+        monster['line'] += line_shift
+        record = new_records.get(id(monster))
+        if record is None:
+            monster['span'] = (start + byte_shift, end + byte_shift)
+            continue
+        old_lines = monster['fields'][-1][0] + 1
+        parsed = next(parse_monster_records(io.BytesIO(record)))
+        monster['fields'] = parsed['fields']
+        # Keep the attributes as they will read back
+        for key in ATTRIBUTE_DIRECTIVES:
+            if key in parsed:
+                monster[key] = parsed[key]
+            else:
+                monster.pop(key, None)
+        mark_monster_changed(monster)
+        monster['span'] = (start + byte_shift, start + byte_shift + len(record))
+        byte_shift += len(record) - (end - start)
+        line_shift += record.count(b'\n') - old_lines
+
+def refresh_record_positions(monsters, path):
+    """Re-read spans, line numbers and fields of every monster from path."""
+    current = {monster['name']: monster for monster in iter_monster_records(path)}
+    for monster in monsters:
+        parsed = current.get(monster['name'])
+        if parsed is not None:
+            monster['span'], monster['line'], monster['fields'] = parsed['span'], parsed['line'], parsed['fields']
+
+def split_records(data):
+    """Split the bytes of a monster file into chunks that each start at a name: line."""
+    chunks = []
+    start = 0
+    position = data.find(b'\nname:')
+    while position != -1:
+        chunks.append(data[start:position + 1])
+        start = position + 1
+        position = data.find(b'\nname:', start)
+    chunks.append(data[start:])
+    return chunks
+
+class BackupStore:
+    """Backups of monster.txt, deduplicated by monster record and compressed.
+
+    A chunk is the file's header or one monster record. A chunk already in
+    the latest backup is not stored again; the others go into the zlib
+    compressed pack of the new backup, so a save that changed a few monsters
+    adds a few records to the store.
+
+    Each backup's list of chunks is written once to its own file in lists/,
+    as runs copied from the previous backup's list plus the chunks that
+    differ, with a full list every SNAPSHOT_INTERVAL backups so that reading
+    one never goes back further. manifest.json only holds a line of
+    metadata per backup, and per expired backup whose list a newer one still
+    builds on."""
+
+    SNAPSHOT_INTERVAL = 10
+
+    def __init__(self, directory=None, retention=None):
+        self.directory = directory or BACKUP_DIR
+        self.retention = BACKUP_RETENTION if retention is None else retention
+        self.manifest_path = os.path.join(self.directory, 'manifest.json')
+
+    def pack_path(self, pack):
+        return os.path.join(self.directory, 'packs', pack + '.zz')
+
+    def list_path(self, backup_id):
+        return os.path.join(self.directory, 'lists', backup_id + '.zz')
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return {'version': 2, 'backups': [], 'bases': []}
+        if manifest.get('version') == 1:
+            manifest = self.upgrade_manifest(manifest)
+        return manifest
+
+    def upgrade_manifest(self, manifest):
+        """Move the chunk lists of a version 1 manifest out into list files."""
+        for backup in manifest['backups']:
+            chunks = [[chunk_hash, *manifest['chunks'][chunk_hash]] for chunk_hash in backup.pop('chunks')]
+            self.save_runs(backup['id'], chunks)
+            backup.update(base=None, depth=0, packs=sorted({pack for _, pack, _, _ in chunks}))
+        manifest = {'version': 2, 'backups': manifest['backups'], 'bases': []}
+        self.save_manifest(manifest)
+        return manifest
+
+    def save_manifest(self, manifest):
+        write_file_atomic(self.manifest_path, [json.dumps(manifest).encode('utf-8')])
+
+    def save_runs(self, backup_id, runs):
+        os.makedirs(os.path.dirname(self.list_path(backup_id)), exist_ok=True)
+        write_file_atomic(self.list_path(backup_id), [zlib.compress(json.dumps(runs).encode('utf-8'))])
+
+    def load_chunks(self, manifest, backup_id):
+        """Return a backup's chunks as [hash, pack, offset, length] lists, in file order."""
+        entries = {entry['id']: entry for entry in manifest['backups'] + manifest['bases']}
+        chain = []
+        while backup_id is not None:
+            chain.append(backup_id)
+            backup_id = entries[backup_id]['base']
+        chunks = []
+        for list_id in reversed(chain):
+            with open(self.list_path(list_id), 'rb') as file:
+                runs = json.loads(zlib.decompress(file.read()))
+            # A run is [start, count] of the previous list, or one chunk
+            resolved = []
+            for run in runs:
+                if len(run) == 2:
+                    resolved.extend(chunks[run[0]:run[0] + run[1]])
                 else:
-                    skip_until_next = False
-                    new_lines.append(line)
-            elif not skip_until_next:
-                new_lines.append(line)
-            elif line.strip() == "":
-                skip_until_next = False
-                new_lines.append(line)
-        
-        # Write changes directly to the original file
-        with open(ANGBAND_MONSTER_FILE, 'w') as file:
-            file.writelines(new_lines)
+                    resolved.append(run)
+            chunks = resolved
+        return chunks
+
+    def list(self):
+        """Return the backups, oldest first."""
+        return self.load_manifest()['backups']
+
+    def find(self, manifest, backup_id):
+        for backup in manifest['backups']:
+            if backup['id'] == backup_id:
+                return backup
+        raise ValueError(f"No backup {backup_id}")
+
+    def add(self, path):
+        """Back up the file at path and return the backup's id.
+
+        If the file is unchanged since the last backup, that one's id is returned."""
+        with open(path, 'rb') as file:
+            data = file.read()
+        manifest = self.load_manifest()
+        digest = hashlib.sha1(data).hexdigest()
+        backups = manifest['backups']
+        if backups and backups[-1]['sha1'] == digest:
+            return backups[-1]['id']
+
+        # Ids are timestamps, like the names of the old backup copies. They
+        # also name packs and lists, which can outlive their backup, so
+        # neither is reused
+        backup_id = base_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        existing = set()
+        for entry in backups + manifest['bases']:
+            existing.add(entry['id'])
+            existing.update(entry['packs'])
+        suffix = 1
+        while backup_id in existing:
+            suffix += 1
+            backup_id = f"{base_id}_{suffix}"
+
+        previous = self.load_chunks(manifest, backups[-1]['id']) if backups else []
+        # Where each chunk of the latest backup is in its list
+        positions = {}
+        for position, entry in enumerate(previous):
+            positions.setdefault(entry[0], position)
+
+        runs = []
+        chunks = []
+        added = {}
+        new_chunks = []
+        offset = 0
+        for chunk in split_records(data):
+            chunk_hash = hashlib.sha1(chunk).hexdigest()
+            position = positions.get(chunk_hash)
+            if position is not None:
+                entry = previous[position]
+                if runs and len(runs[-1]) == 2 and sum(runs[-1]) == position:
+                    runs[-1][1] += 1
+                else:
+                    runs.append([position, 1])
+            else:
+                entry = added.get(chunk_hash)
+                if entry is None:
+                    entry = added[chunk_hash] = [chunk_hash, backup_id, offset, len(chunk)]
+                    new_chunks.append(chunk)
+                    offset += len(chunk)
+                runs.append(entry)
+            chunks.append(entry)
+
+        depth = backups[-1]['depth'] + 1 if backups else 0
+        if depth >= self.SNAPSHOT_INTERVAL:
+            depth = 0
+        if depth == 0:
+            runs = chunks
+
+        # Write the pack and chunk list before the manifest that refers to them
+        if new_chunks:
+            os.makedirs(os.path.dirname(self.pack_path(backup_id)), exist_ok=True)
+            write_file_atomic(self.pack_path(backup_id), [zlib.compress(b''.join(new_chunks))])
+        self.save_runs(backup_id, runs)
+        backups.append({
+            'id': backup_id,
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'size': len(data),
+            'sha1': digest,
+            'records': len(chunks),
+            'stored': len(new_chunks),
+            'base': backups[-1]['id'] if depth else None,
+            'depth': depth,
+            'packs': sorted({pack for _, pack, _, _ in chunks}),
+        })
+        self.collect_garbage(manifest)
+        self.save_manifest(manifest)
+        return backup_id
+
+    def collect_garbage(self, manifest):
+        """Drop the oldest backups past the retention limit, with the lists
+        no remaining backup builds on and the packs no remaining list uses."""
+        keep = len(manifest['backups']) - self.retention
+        if keep <= 0:
+            return
+        expired = manifest['backups'][:keep]
+        del manifest['backups'][:keep]
+        entries = {entry['id']: entry for entry in manifest['bases'] + expired}
+        needed = set()
+        for backup in manifest['backups']:
+            base = backup['base']
+            while base in entries and base not in needed:
+                needed.add(base)
+                base = entries[base]['base']
+        removed = [entry for entry in entries.values() if entry['id'] not in needed]
+        manifest['bases'] = [entry for entry in entries.values() if entry['id'] in needed]
+        live_packs = {pack for entry in manifest['backups'] + manifest['bases'] for pack in entry['packs']}
+        for entry in removed:
+            paths = [self.list_path(entry['id'])]
+            paths.extend(self.pack_path(pack) for pack in entry['packs'] if pack not in live_packs)
+            for expired_path in paths:
+                try:
+                    os.unlink(expired_path)
+                except FileNotFoundError:
+                    pass
+
+    def read(self, backup_id):
+        """Return the contents of monster.txt as it was in a backup."""
+        manifest = self.load_manifest()
+        backup = self.find(manifest, backup_id)
+        packs = {}
+        parts = []
+        for _, pack, offset, length in self.load_chunks(manifest, backup_id):
+            if pack not in packs:
+                with open(self.pack_path(pack), 'rb') as file:
+                    packs[pack] = zlib.decompress(file.read())
+            parts.append(packs[pack][offset:offset + length])
+        data = b''.join(parts)
+        if hashlib.sha1(data).hexdigest() != backup['sha1']:
+            raise ValueError(f"Backup {backup_id} is damaged")
+        return data
+
+    def restore(self, backup_id, path):
+        """Replace the file at path with a backup, backing up its current contents first.
+
+        Returns the id of the backup of the replaced contents."""
+        data = self.read(backup_id)
+        previous_id = self.add(path)
+        write_file_atomic(path, [data])
+        return previous_id
+
+    def diff(self, backup_id, path, other_id=None):
+        """Return a unified diff from a backup to the file at path, or to another backup."""
+        old = self.read(backup_id).decode('utf-8').splitlines(True)
+        if other_id:
+            new = self.read(other_id)
+        else:
+            with open(path, 'rb') as file:
+                new = file.read()
+        new = new.decode('utf-8').splitlines(True)
+        return difflib.unified_diff(old, new, backup_id, other_id or os.path.basename(path))
+
+def save_all_changes(monsters):
+    """Save all changes to the original monster file and create a backup.
+
+    Only the records of modified monsters are rewritten; the rest of the file
+    is copied across byte for byte between them. Returns the backup id and
+    the path of the monster file."""
+    try:
+        # Back up the original file
+        backup_id = BackupStore().add(ANGBAND_MONSTER_FILE)
         
-        return backup_filepath, ANGBAND_MONSTER_FILE
+        changed = sorted((m for m in monsters if m['name'] in modified_monsters), key=lambda m: m['span'][0])
+        if not spans_match_file(changed, ANGBAND_MONSTER_FILE):
+            # The file was changed by something else since it was parsed
+            refresh_record_positions(monsters, ANGBAND_MONSTER_FILE)
+            changed.sort(key=lambda m: m['span'][0])
+        records = [format_monster_record(m).encode('utf-8') for m in changed]
+
+        def chunks(file):
+            position = 0
+            for monster, record in zip(changed, records):
+                start, end = monster['span']
+                yield file.read(start - position)
+                yield record
+                file.seek(end)
+                position = end
+            yield from iter(lambda: file.read(1 << 20), b'')
+
+        with open(ANGBAND_MONSTER_FILE, 'rb') as file:
+            write_file_atomic(ANGBAND_MONSTER_FILE, chunks(file))
+
+        update_record_positions(monsters, changed, records)
+        modified_monsters.clear()
+        # Pickling every monster again would make a save cost as much as the
+        # whole file; the next launch re-parses and caches it instead
+        invalidate_parse_cache(ANGBAND_MONSTER_FILE)
+
+        return backup_id, ANGBAND_MONSTER_FILE
     except Exception as e:
         print(f"Error saving changes: {e}")
         return None, None
 
+# Attributes a batch file can change, under the names it may use for them
+BATCH_FIELDS = {
+    'speed': 'speed',
+    'hit-points': 'health',
+    'health': 'health',
+    'experience': 'experience',
+    'spell-power': 'spell_power',
+    'spell_power': 'spell_power',
+    'rarity': 'rarity',
+    'desc': 'description',
+    'description': 'description',
+    'flags-off': 'flags_off',
+    'flags_off': 'flags_off',
+}
+
+CONDITION_TOKEN = re.compile(r'\s*(?:(\()|(\))|(==|!=|<=|>=|=|<|>)|("(?:[^"\\]|\\.)*")|([^\s()=!<>"]+))')
+
+def monster_value(monster, field):
+    """Return a field of a monster for a batch condition: an attribute, or any directive such as depth."""
+    if field == 'name':
+        return monster['name']
+    if field in BATCH_FIELDS:
+        value = monster.get(BATCH_FIELDS[field])
+    else:
+        value = get_field(monster, field)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+def compare(value, op, other):
+    """Compare a monster's field with a value from a condition."""
+    if value is None:
+        return op == '!='
+    try:
+        other = int(other)
+    except ValueError:
+        value = str(value).lower()
+        other = other.lower()
+    if isinstance(value, str) != isinstance(other, str):
+        return op == '!='
+    return {'=': value == other, '==': value == other, '!=': value != other, '<': value < other,
+            '<=': value <= other, '>': value > other, '>=': value >= other}[op]
+
+def parse_condition(text):
+    """Compile a batch where clause into a function of a monster.
+
+    Conditions combine with and, or, not and parentheses. An atom is a
+    comparison like depth > 30, name matches REGEX, or a bare uppercase flag
+    name, which is true for monsters that have the flag."""
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = CONDITION_TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise ValueError(f"can't parse condition at {text[position:]!r}")
+        kind = match.lastindex
+        value = match.group(kind)
+        tokens.append((('(', ')', 'op', 'str', 'word')[kind - 1], json.loads(value) if kind == 4 else value))
+        position = match.end()
+    position = 0
+
+    def peek():
+        if position < len(tokens):
+            return tokens[position]
+        return (None, None)
+
+    def take(kind=None):
+        nonlocal position
+        token = peek()
+        if token[0] is None:
+            raise ValueError(f"unexpected end of condition {text!r}")
+        if kind and token[0] != kind:
+            raise ValueError(f"unexpected {token[1]!r} in condition {text!r}")
+        position += 1
+        return token
+
+    def keyword(word):
+        token = peek()
+        return token[0] == 'word' and token[1].lower() == word
+
+    def expression():
+        left = term()
+        while keyword('or'):
+            take()
+            right = term()
+            left = (lambda a, b: lambda m: a(m) or b(m))(left, right)
+        return left
+
+    def term():
+        left = factor()
+        while keyword('and'):
+            take()
+            right = factor()
+            left = (lambda a, b: lambda m: a(m) and b(m))(left, right)
+        return left
+
+    def factor():
+        if keyword('not'):
+            take()
+            inner = factor()
+            return lambda m: not inner(m)
+        if peek()[0] == '(':
+            take()
+            inner = expression()
+            take(')')
+            return inner
+        _, field = take('word')
+        if field.lower() == 'name' and keyword('matches'):
+            take()
+            _, pattern = take()
+            regex = re.compile(pattern, re.IGNORECASE)
+            return lambda m: regex.search(m['name']) is not None
+        if peek()[0] == 'op':
+            _, op = take()
+            _, value = take()
+            field = field.lower()
+            return lambda m: compare(monster_value(m, field), op, value)
+        if field.isupper():
+            return lambda m: field in monster_flags(m)
+        raise ValueError(f"expected a comparison or a FLAG at {field!r} in condition {text!r}")
+
+    condition = expression()
+    if position != len(tokens):
+        raise ValueError(f"unexpected {tokens[position][1]!r} in condition {text!r}")
+    return condition
+
+def set_field(field, op, value):
+    """Return an action that changes an attribute of a monster, e.g. speed += 10."""
+    key = BATCH_FIELDS.get(field.lower())
+    if key is None:
+        raise ValueError(f"can't change {field!r}, only {', '.join(sorted(BATCH_FIELDS))}")
+    numeric = key in INT_FIELDS.values()
+    if op != '=' and not numeric:
+        raise ValueError(f"{field} is not a number, only = can change it")
+    try:
+        if numeric:
+            value = float(value) if op == '*=' else int(value)
+    except ValueError:
+        raise ValueError(f"{field} needs a number, not {value!r}")
+
+    def action(monster):
+        old = monster.get(key)
+        if op == '=':
+            new = value
+        elif not isinstance(old, int):
+            return None
+        elif op == '+=':
+            new = old + value
+        elif op == '-=':
+            new = old - value
+        else:
+            new = int(round(old * value))
+        if new == old:
+            return None
+        monster[key] = new
+        return f"{field}: {old} -> {new}"
+    return action
+
+def change_flags(add, flags):
+    """Return an action that adds or removes flags."""
+    flags = [flag.upper() for flag in flags if flag]
+
+    def action(monster):
+        current = monster_flags(monster)
+        if add:
+            missing = [flag for flag in flags if flag not in current]
+            if not missing:
+                return None
+            monster['flags'] = monster.get('flags', []) + [' | '.join(missing)]
+            return f"+flags {' '.join(missing)}"
+        present = [flag for flag in flags if flag in current]
+        if not present:
+            return None
+        lines = []
+        for line in monster['flags']:
+            kept = [flag for flag in re.split(r'[|\s]+', line) if flag and flag not in present]
+            if kept:
+                lines.append(' | '.join(kept))
+        monster['flags'] = lines
+        return f"-flags {' '.join(present)}"
+    return action
+
+def change_blows(add, blow):
+    """Return an action that adds a blow, or removes the blows starting with METHOD[:EFFECT]."""
+    blow = Blow.parse(blow)
+    if add:
+        blow = blow.validate()
+
+    def action(monster):
+        blows = monster.get('blows', [])
+        if add:
+            monster['blows'] = blows + [blow]
+            return f"+blow {blow}"
+        kept = [b for b in blows if not b.matches(blow)]
+        if len(kept) == len(blows):
+            return None
+        monster['blows'] = kept
+        return f"-blow {blow}"
+    return action
+
+BATCH_LINE = re.compile(r'''
+    ^(?:(?P<field>[\w-]+)\s*(?P<op>[+*-]?=)\s*(?P<value>"(?:[^"\\]|\\.)*"|\S+)
+    |(?P<verb>add|remove)\s+(?P<what>flags?|blows?)\s+(?P<items>[\w:| ]+?))
+    (?:\s+where\s+(?P<where>.+)|\s+to\s+names\s+matching\s+(?P<matching>.+))?$''',
+    re.IGNORECASE | re.VERBOSE)
+
+def parse_batch_line(line):
+    """Compile one line of a batch script into (condition, action)."""
+    match = BATCH_LINE.match(line)
+    if not match:
+        raise ValueError("expected 'FIELD OP VALUE', 'add flag ...', 'remove blow ...' or similar")
+    if match['where']:
+        condition = parse_condition(match['where'])
+    elif match['matching']:
+        regex = re.compile(match['matching'].strip(), re.IGNORECASE)
+        condition = lambda m: regex.search(m['name']) is not None
+    else:
+        condition = lambda m: True
+    if match['field']:
+        value = match['value']
+        if value.startswith('"'):
+            value = json.loads(value)
+        return condition, set_field(match['field'], match['op'], value)
+    add = match['verb'].lower() == 'add'
+    if match['what'].lower().startswith('flag'):
+        return condition, change_flags(add, re.split(r'[|\s]+', match['items'].strip()))
+    return condition, change_blows(add, match['items'].strip())
+
+def patch_operations(label, condition, changes):
+    """Turn a JSON object or CSV row of field: value changes into batch operations.
+
+    A value like "+=10" changes a number; add_flags, remove_flags, add_blows and
+    remove_blows take lists."""
+    operations = []
+    for field, value in changes.items():
+        if value is None or value == '':
+            continue
+        field = field.strip()
+        if field in ('add_flags', 'remove_flags'):
+            flags = value if isinstance(value, list) else re.split(r'[|\s]+', value.strip())
+            operations.append((f"{label}: {field}", condition, change_flags(field == 'add_flags', flags)))
+        elif field in ('add_blows', 'remove_blows'):
+            for blow in value if isinstance(value, list) else value.split():
+                operations.append((f"{label}: {field}", condition, change_blows(field == 'add_blows', blow)))
+        else:
+            op = '='
+            if isinstance(value, str) and value[:2] in ('+=', '-=', '*='):
+                op, value = value[:2], value[2:].strip()
+            operations.append((f"{label}: {field}", condition, set_field(field, op, value)))
+    return operations
+
+def patch_condition(entry):
+    """Pop the name or where key of a JSON or CSV patch entry and return its condition."""
+    name = entry.pop('name', None)
+    where = entry.pop('where', None)
+    if name:
+        name = name.strip().lower()
+        return lambda m: m['name'].lower() == name
+    if where:
+        return parse_condition(where)
+    raise ValueError("needs a name or where")
+
+def load_batch_file(path):
+    """Read a batch file into a list of (label, condition, action) operations.
+
+    .json files hold a list of objects and .csv files a table, each entry
+    picking monsters by name or with a where condition and giving the changes
+    to make. Anything else is a script with one change per line, e.g.
+    speed += 10 where depth > 30."""
+    operations = []
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'r', newline='') as file:
+        if extension in ('.json', '.csv'):
+            if extension == '.json':
+                entries = json.load(file)
+                if not isinstance(entries, list):
+                    raise ValueError(f"{path}: expected a list of objects")
+                entries = enumerate(entries, 1)
+                label = "entry"
+            else:
+                entries = enumerate(csv.DictReader(file), 2)
+                label = "line"
+            for number, entry in entries:
+                if not isinstance(entry, dict):
+                    raise ValueError(f"{path}: {label} {number}: expected an object, not {json.dumps(entry)}")
+                try:
+                    entry = dict(entry)
+                    operations.extend(patch_operations(f"{label} {number}", patch_condition(entry), entry))
+                except (ValueError, re.error) as e:
+                    raise ValueError(f"{path}: {label} {number}: {e}")
+        else:
+            for number, line in enumerate(file, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    operations.append((f"line {number}: {line}", *parse_batch_line(line)))
+                except (ValueError, re.error) as e:
+                    raise ValueError(f"{path}: line {number}: {e}")
+    return operations
+
+def apply_batch(monsters, operations):
+    """Apply batch operations to every monster they select, in order.
+
+    Returns the changes made to each monster, by name, and how many monsters
+    each operation changed."""
+    changes = {}
+    counts = [0] * len(operations)
+    for monster in monsters:
+        for i, (_, condition, action) in enumerate(operations):
+            if condition(monster):
+                change = action(monster)
+                if change:
+                    counts[i] += 1
+                    changes.setdefault(monster['name'], []).append(change)
+        if monster['name'] in changes:
+            modified_monsters.add(monster['name'])
+            if monster_index is not None:
+                monster_index.flags.update(monster)
+            mark_monster_changed(monster)
+    return changes, counts
+
+def run_batch(path, dry_run=False):
+    """Apply a batch file to monster.txt with one parse and one save, and print a summary."""
+    operations = load_batch_file(path)
+    monsters = get_monster_index().monsters
+    changes, counts = apply_batch(monsters, operations)
+
+    for name, monster_changes in changes.items():
+        print(f"{name}: {', '.join(monster_changes)}")
+    if changes:
+        print()
+    for (label, _, _), count in zip(operations, counts):
+        print(f"{count:6} monsters  {label}")
+    print(f"\n{len(changes)} of {len(monsters)} monsters changed")
+
+    if dry_run:
+        print("Dry run, nothing saved")
+        return
+    if not changes:
+        return
+    backup_id, game_file = save_all_changes(monsters)
+    if game_file:
+        print(f"Changes written to: {os.path.basename(game_file)}")
+        print(f"Backup saved as: {backup_id} (undo with --restore {backup_id})")
+
 def curses_main(stdscr):
     # Initialize curses with proper settings
     init_curses()
@@ -591,8 +1937,9 @@ def curses_main(stdscr):
     list_win = curses.newwin(height - 6, width, 3, 0)
     status_win = curses.newwin(3, width, height - 3, 0)
     
-    # Load monsters
-    monsters = parse_monster_file()
+    # Load monsters once; search works on the same objects through the index
+    index = get_monster_index()
+    monsters = index.monsters
     current_monsters = monsters
     
     # Initialize variables
@@ -600,39 +1947,48 @@ def curses_main(stdscr):
     offset = 0
     search_mode = False
     search_string = ""
+    search_stack = [monsters]
+    pre_search = (current_monsters, current_pos, offset)
+    
+    # What each window shows, so only changed rows are redrawn
+    header_rows = WindowRows(header_win)
+    list_rows = WindowRows(list_win)
+    status_rows = WindowRows(status_win)
+    list_height = height - 6
     
     # Main loop
     while True:
-        # Clear windows
-        header_win.clear()
-        list_win.clear()
-        status_win.clear()
-        
+        draw_start = time.perf_counter()
         # Draw header
-        safe_addstr(header_win, 0, 0, "Angband Monster Editor", COLOR_HEADER)
-        safe_addstr(header_win, 1, 0, "=" * (width - 1), COLOR_DEFAULT)
+        header_rows.draw(0, "Angband Monster Editor", COLOR_HEADER)
+        header_rows.draw(1, "=" * (width - 1), COLOR_DEFAULT)
         
-        # Draw monster list
-        list_height = height - 6
-        for i in range(min(list_height, len(current_monsters) - offset)):
-            monster = current_monsters[offset + i]
-            if offset + i == current_pos:
-                safe_addstr(list_win, i, 0, f"> {monster['name']}", curses.A_REVERSE)
+        # Draw the visible part of the monster list
+        for i in range(list_height):
+            row = offset + i
+            if row >= len(current_monsters):
+                list_rows.draw(i, "")
+            elif row == current_pos:
+                list_rows.draw(i, f"> {current_monsters[row]['name']}"[:width - 1], curses.A_REVERSE)
             else:
-                safe_addstr(list_win, i, 0, f"  {monster['name']}", COLOR_DEFAULT)
+                list_rows.draw(i, f"  {current_monsters[row]['name']}"[:width - 1], COLOR_DEFAULT)
         
         # Draw status
-        safe_addstr(status_win, 0, 0, "=" * (width - 1), COLOR_DEFAULT)
+        status_rows.draw(0, "=" * (width - 1), COLOR_DEFAULT)
         if search_mode:
-            safe_addstr(status_win, 1, 0, f"Search: {search_string}", COLOR_HIGHLIGHT)
+            status_rows.draw(1, f"Search: {search_string}  ({len(current_monsters)} matches)", COLOR_HIGHLIGHT)
         else:
-            safe_addstr(status_win, 1, 0, "q:Quit  s:Search  Enter:View Details  j/k:Navigate", COLOR_INFO)
+            status_rows.draw(1, "q:Quit  s:Search  f:Filter  F:Flags  Enter:View  j/k/PgUp/PgDn/g/G:Navigate", COLOR_INFO)
+        if load_warnings:
+            status_rows.draw(2, load_warning_summary()[:width - 1], COLOR_HIGHLIGHT)
         
-        # Refresh windows
-        header_win.refresh()
-        list_win.refresh()
-        status_win.refresh()
-        stdscr.refresh()  # Ensure the main screen is refreshed too
+        # Send all the changes to the terminal at once
+        header_win.noutrefresh()
+        list_win.noutrefresh()
+        status_win.noutrefresh()
+        curses.doupdate()
+        if profiler is not None:
+            profiler.add('draw', time.perf_counter() - draw_start)
         
         # Get input
         key = stdscr.getch()
@@ -641,30 +1997,30 @@ def curses_main(stdscr):
             if key == 27:  # ESC
                 search_mode = False
                 search_string = ""
+                current_monsters, current_pos, offset = pre_search
             elif key == 10 or key == 13:  # Enter
                 search_mode = False
-                if search_string:
-                    results = search_monsters(search_string)
-                    if results:
-                        current_monsters = results
-                        current_pos = 0
-                        offset = 0
+                if not search_string or not current_monsters:
+                    current_monsters, current_pos, offset = pre_search
                 search_string = ""
             elif key == 8 or key == 127 or key == curses.KEY_BACKSPACE:  # Backspace (multiple possible key codes)
                 if search_string:
+                    # Go back to the results we had before the last keystroke
                     search_string = search_string[:-1]
-                    # Redraw immediately to show the change
-                    status_win.clear()
-                    safe_addstr(status_win, 0, 0, "=" * (width - 1), COLOR_DEFAULT)
-                    safe_addstr(status_win, 1, 0, f"Search: {search_string}", COLOR_HIGHLIGHT)
-                    status_win.refresh()
+                    search_stack.pop()
+                    current_monsters = search_stack[-1]
+                    current_pos = 0
+                    offset = 0
             elif 32 <= key <= 126:  # Printable characters
                 search_string += chr(key)
-                # Redraw immediately to show the change
-                status_win.clear()
-                safe_addstr(status_win, 0, 0, "=" * (width - 1), COLOR_DEFAULT)
-                safe_addstr(status_win, 1, 0, f"Search: {search_string}", COLOR_HIGHLIGHT)
-                status_win.refresh()
+                if len(search_stack) == 1:
+                    results = index.search(search_string)
+                else:
+                    results = index.narrow(search_stack[-1], search_string)
+                search_stack.append(results)
+                current_monsters = results
+                current_pos = 0
+                offset = 0
         else:
             if key == ord('q'):
                 if modified_monsters:
@@ -675,18 +2031,64 @@ def curses_main(stdscr):
                     
                     save_choice = stdscr.getch()
                     if save_choice == ord('y'):
-                        new_file = save_all_changes(monsters)
+                        backup_file, new_file = save_all_changes(monsters)
                         if new_file:
                             status_win.clear()
                             safe_addstr(status_win, 0, 0, f"Changes saved to: {os.path.basename(new_file)}", COLOR_INFO)
                             status_win.refresh()
                             stdscr.getch()  # Wait for key press
                 break
+            elif key == ord('f'):
+                query = handle_input_editing(
+                    status_win,
+                    width,
+                    prompt="Filter, e.g. speed > 120 and hp > 500 sort by depth desc (empty for all):"
+                )
+                status_rows.invalidate()
+                if query is not None:
+                    try:
+                        results, _ = get_monster_table().query(query)
+                    except ValueError as e:
+                        status_win.clear()
+                        safe_addstr(status_win, 1, 0, str(e), COLOR_IMPORTANT)
+                        status_win.refresh()
+                        stdscr.getch()  # Wait for key press
+                        status_rows.invalidate()
+                    else:
+                        if results:
+                            current_monsters = results
+                            current_pos = 0
+                            offset = 0
+            elif key == ord('F'):
+                query = handle_input_editing(
+                    status_win,
+                    width,
+                    prompt="Flags, e.g. UNIQUE and not NEVER_MOVE (empty for all):"
+                )
+                status_rows.invalidate()
+                if query is not None:
+                    try:
+                        results = index.flags.query(query)
+                    except ValueError as e:
+                        status_win.clear()
+                        safe_addstr(status_win, 1, 0, str(e), COLOR_IMPORTANT)
+                        status_win.refresh()
+                        stdscr.getch()  # Wait for key press
+                        status_rows.invalidate()
+                    else:
+                        if results:
+                            current_monsters = results
+                            current_pos = 0
+                            offset = 0
             elif key == ord('s'):
                 search_mode = True
                 search_string = ""
+                # Result sets for each prefix of the search string, so
+                # typing narrows the last one and backspace pops it
+                search_stack = [monsters]
+                pre_search = (current_monsters, current_pos, offset)
             # Handle navigation
-            elif key in (ord('j'), ord('k')):
+            elif key in (ord('j'), ord('k')) or key in PAGE_KEYS:
                 new_pos, new_offset = navigate_list(current_pos, key, current_monsters, offset, list_height)
                 if new_pos != current_pos or new_offset != offset:
                     current_pos = new_pos
@@ -699,6 +2101,9 @@ def curses_main(stdscr):
                     
                     # Create a scrollable details view
                     show_monster_details(detail_win, monster, height, width)
+                    # The details view covered the whole screen
+                    for window in (header_win, list_win, status_win):
+                        window.touchwin()
 
 def parse_blow_data(filename):
     """Parse blow effects or methods file."""
@@ -725,16 +2130,139 @@ def parse_blow_data(filename):
             
     return data
 
+class GamedataTable:
+    """The entries of a gamedata file such as blow_methods.txt, with a sorted
+    pick-list of names and a case-insensitive index into it."""
+
+    def __init__(self, path, stamp, data):
+        self.path = path
+        self.stamp = stamp
+        self.descriptions = data
+        self.names = sorted(data)
+        self.keys = [name.upper() for name in self.names]
+        self.index = {key: name for key, name in zip(self.keys, self.names)}
+
+    def __contains__(self, name):
+        return name.upper() in self.index
+
+    def find(self, name):
+        """Return the entry called name in any case, or None."""
+        return self.index.get(name.upper())
+
+    def matching(self, prefix):
+        """Return the names starting with prefix, in order."""
+        prefix = prefix.upper()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\U0010ffff', start)
+        return self.names[start:end]
+
+class GamedataRegistry:
+    """Reference tables read from lib/gamedata, loaded once per session.
+
+    A table is read again only when its file's size or modification time
+    changes, so the blow editor and validation can ask for it every time."""
+
+    def __init__(self):
+        self.tables = {}
+
+    def table(self, path):
+        """Return the table for a gamedata file, reading it if it changed."""
+        stat = os.stat(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        table = self.tables.get(path)
+        if table is None or table.stamp != stamp:
+            table = self.tables[path] = GamedataTable(path, stamp, parse_blow_data(path))
+        return table
+
+    def blow_methods(self):
+        return self.table(BLOW_METHODS_FILE)
+
+    def blow_effects(self):
+        return self.table(BLOW_EFFECTS_FILE)
+
+    def check_blow(self, method, effect=None):
+        """Return the method and effect as named in the gamedata files.
+
+        Raises ValueError for an unknown one, suggesting names that start the same way."""
+        checked = []
+        for kind, table, name in (('method', self.blow_methods(), method), ('effect', self.blow_effects(), effect)):
+            if name is None:
+                checked.append(None)
+                continue
+            found = table.find(name)
+            if found is None:
+                suggestions = table.matching(name[:1])[:5]
+                hint = f", e.g. {' '.join(suggestions)}" if suggestions else ""
+                raise ValueError(f"Unknown blow {kind} {name.upper()}{hint}")
+            checked.append(found)
+        return tuple(checked)
+
+# Shared registry of gamedata tables
+gamedata = GamedataRegistry()
+
+def parse_blow_input(text):
+    """Turn blow editor input like 'claw hurt 1d6' into a checked Blow."""
+    blow = Blow.parse(text.replace(':', ' '))
+    if blow.dice is None:  # Need at least method, effect, and damage
+        raise ValueError("Invalid format. Use: method effect damage")
+    return blow.validate()
+
+def check_monsters(monsters):
+    """Yield (monster, problem) for each blow whose method or effect isn't in the gamedata files."""
+    # Most blows share a few method and effect pairs, so each is looked up once
+    checked = {}
+    for monster in monsters:
+        for blow in monster.get('blows', []):
+            key = (blow.method, blow.effect)
+            if key not in checked:
+                try:
+                    gamedata.check_blow(*key)
+                    checked[key] = None
+                except ValueError as e:
+                    checked[key] = str(e)
+            if checked[key]:
+                yield monster, f"blow {blow}: {checked[key]}"
+
+def check_loaded_monsters(monsters):
+    """Intern the flag set of every monster and check its blows, as monster.txt is loaded.
+
+    Cached monsters are checked too, since the gamedata files may have changed
+    since the cache was written. The problems are kept in load_warnings."""
+    for monster in monsters:
+        monster_flags(monster)
+    try:
+        load_warnings[:] = [f"line {monster['line']}: {monster['name']}: {problem}"
+                            for monster, problem in check_monsters(monsters)]
+    except OSError as e:
+        load_warnings[:] = [f"Blows not checked: {e}"]
+
+def load_warning_summary():
+    """Return one line describing load_warnings, or None if there are none."""
+    if len(load_warnings) == 1:
+        return load_warnings[0]
+    if load_warnings:
+        return f"{len(load_warnings)} problems in monster.txt; run with --check to list them"
+    return None
+
+def print_check():
+    """Print the problems check_monsters finds in monster.txt."""
+    monsters = get_monster_index().monsters
+    problems = 0
+    for monster, problem in check_monsters(monsters):
+        print(f"line {monster['line']}: {monster['name']}: {problem}")
+        problems += 1
+    print(f"\n{problems} problems in {len(monsters)} monsters" if problems else f"{len(monsters)} monsters, no problems")
+
 def edit_monster_blow(window, monster, height, width):
     """Edit a monster's blow attacks with a simplified interface that works on smaller screens."""
     # Use a single window approach instead of multiple windows
     window.clear()
     window.refresh()
     
-    # Load blow effects and methods
+    # Load blow effects and methods, once per session
     try:
-        effects = parse_blow_data(BLOW_EFFECTS_FILE)
-        methods = parse_blow_data(BLOW_METHODS_FILE)
+        gamedata.blow_effects()
+        gamedata.blow_methods()
     except Exception as e:
         window.addstr(0, 0, f"Error loading blow data: {str(e)}")
         window.refresh()
@@ -843,42 +2371,22 @@ def edit_monster_blow(window, monster, height, width):
                 curses.curs_set(0)  # Hide cursor
             
             if new_blow:
-                parts = new_blow.split()
-                if len(parts) >= 3:  # Need at least method, effect, and damage
-                    method = parts[0].upper()  # Convert to uppercase
-                    effect = parts[1].upper()  # Convert to uppercase
-                    damage = parts[2]
-                    
-                    # Check if method and effect exist (case-insensitive)
-                    method_exists = method in methods or method.lower() in [m.lower() for m in methods]
-                    effect_exists = effect in effects or effect.lower() in [e.lower() for e in effects]
-                    
-                    if method_exists and effect_exists:
-                        # Format the blow properly: METHOD:EFFECT:DAMAGE
-                        formatted_blow = f"{method}:{effect}:{damage}"
-                        blows.append(formatted_blow)
-                        current_pos = len(blows) - 1
-                        changes_made = True
-                    else:
-                        window.addstr(footer_y + 1, 0, "Unknown method or effect", COLOR_IMPORTANT)
-                        window.clrtoeol()
-                        window.refresh()
-                        window.getch()
-                else:
-                    window.addstr(footer_y + 1, 0, "Invalid format. Use: method effect damage", COLOR_IMPORTANT)
+                try:
+                    # Format the blow properly: METHOD:EFFECT:DAMAGE
+                    blows.append(parse_blow_input(new_blow))
+                    current_pos = len(blows) - 1
+                    changes_made = True
+                except ValueError as e:
+                    window.addstr(footer_y + 1, 0, str(e)[:width - 1], COLOR_IMPORTANT)
                     window.clrtoeol()
                     window.refresh()
                     window.getch()
                 
         elif key == ord('e') and blows:  # Edit blow
             if current_pos < len(blows):
-                # Parse the current blow to display in a more user-friendly format
+                # Display the current blow in a more user-friendly format
                 current_blow = blows[current_pos]
-                parts = current_blow.split(':')
-                if len(parts) >= 3:
-                    display_blow = f"{parts[0]} {parts[1]} {parts[2]}"
-                else:
-                    display_blow = current_blow
+                display_blow = str(current_blow).replace(':', ' ')
                 
                 prompt = "Edit blow (method effect damage) or ESC to cancel:"
                 window.addstr(footer_y + 1, 0, prompt, COLOR_HIGHLIGHT)
@@ -924,28 +2432,12 @@ def edit_monster_blow(window, monster, height, width):
                     curses.curs_set(0)  # Hide cursor
                 
                 if edited_blow:
-                    parts = edited_blow.split()
-                    if len(parts) >= 3:  # Need at least method, effect, and damage
-                        method = parts[0].upper()  # Convert to uppercase
-                        effect = parts[1].upper()  # Convert to uppercase
-                        damage = parts[2]
-                        
-                        # Check if method and effect exist (case-insensitive)
-                        method_exists = method in methods or method.lower() in [m.lower() for m in methods]
-                        effect_exists = effect in effects or effect.lower() in [e.lower() for e in effects]
-                        
-                        if method_exists and effect_exists:
-                            # Format the blow properly: METHOD:EFFECT:DAMAGE
-                            formatted_blow = f"{method}:{effect}:{damage}"
-                            blows[current_pos] = formatted_blow
-                            changes_made = True
-                        else:
-                            window.addstr(footer_y + 1, 0, "Unknown method or effect", COLOR_IMPORTANT)
-                            window.clrtoeol()
-                            window.refresh()
-                            window.getch()
-                    else:
-                        window.addstr(footer_y + 1, 0, "Invalid format. Use: method effect damage", COLOR_IMPORTANT)
+                    try:
+                        # Format the blow properly: METHOD:EFFECT:DAMAGE
+                        blows[current_pos] = parse_blow_input(edited_blow)
+                        changes_made = True
+                    except ValueError as e:
+                        window.addstr(footer_y + 1, 0, str(e)[:width - 1], COLOR_IMPORTANT)
                         window.clrtoeol()
                         window.refresh()
                         window.getch()
@@ -1159,31 +2651,147 @@ def edit_monster_flags(window, monster, height, width):
     
     return changes_made
 
+# Functions timed with --profile, by the phase they count towards. Only the
+# innermost search calls are timed, since search_monsters just calls
+# MonsterIndex.search and wrapping both would count its time twice
+PROFILED_FUNCTIONS = {
+    'parse_monster_file': 'parse',
+    'generate_monster_content': 'render',
+    'save_all_changes': 'save',
+}
+PROFILED_METHODS = {
+    (MonsterIndex, 'search'): 'search',
+    (MonsterIndex, 'narrow'): 'search',
+    (FlagIndex, 'evaluate'): 'search',
+    (MonsterTable, 'query'): 'search',
+}
+
+class Profiler:
+    """Latencies of the editor's phases, collected with --profile.
+
+    Timed functions are wrapped when profiling starts, so without --profile
+    they run exactly as written."""
+
+    def __init__(self, dump_path=None):
+        self.samples = {}
+        self.dump_path = dump_path
+        self.cprofile = cProfile.Profile() if dump_path else None
+
+    def add(self, phase, seconds):
+        self.samples.setdefault(phase, []).append(seconds)
+
+    def wrap(self, phase, func):
+        """Return func, timing each call as part of phase."""
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - start)
+        return timed
+
+    def start(self):
+        module = globals()
+        for name, phase in PROFILED_FUNCTIONS.items():
+            module[name] = self.wrap(phase, module[name])
+        for (cls, name), phase in PROFILED_METHODS.items():
+            setattr(cls, name, self.wrap(phase, getattr(cls, name)))
+        if self.cprofile:
+            self.cprofile.enable()
+
+    def stop(self):
+        if self.cprofile:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.dump_path)
+
+    def summary(self):
+        """Return the per-phase latency table as lines of text."""
+        lines = [f"{'phase':10}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for phase, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            total = sum(samples)
+            p50 = samples[len(samples) // 2]
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            lines.append(f"{phase:10}{len(samples):8}{total * 1000:12.2f}{total / len(samples) * 1000:10.3f}"
+                         f"{p50 * 1000:10.3f}{p95 * 1000:10.3f}{samples[-1] * 1000:10.3f}")
+        if not self.samples:
+            lines.append("(nothing was timed)")
+        return lines
+
+# The active profiler, when running with --profile
+profiler = None
+
 def main():
+    global profiler
     # Initialize terminal for better display
     os.environ.setdefault('TERM', 'xterm-256color')
     
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Angband Monster Editor")
     parser.add_argument("--test", action="store_true", help="Run test mode: modify Blubbering idiot and save")
+    parser.add_argument("--backups", action="store_true", help="List the backups of monster.txt")
+    parser.add_argument("--restore", metavar="ID", help="Restore monster.txt from a backup")
+    parser.add_argument("--diff", nargs='+', metavar="ID",
+                        help="Show the changes from a backup to monster.txt, or between two backups")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Apply the changes in a script, .json or .csv file and save")
+    parser.add_argument("--dry-run", action="store_true", help="With --batch, show the changes without saving")
+    parser.add_argument("--query", metavar="QUERY",
+                        help="List monsters matching e.g. 'speed > 120 and hp > 500 sort by depth desc limit 10'")
+    parser.add_argument("--flags", metavar="QUERY",
+                        help="List monsters matching a flag query, e.g. 'UNIQUE or EVIL and not NEVER_MOVE'")
+    parser.add_argument("--stats", metavar="COLUMN", help="Show count, min, max and mean of a numeric column")
+    parser.add_argument("--by", metavar="COLUMN", help="With --stats, group by another column, e.g. depth")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time parsing, search, rendering, drawing and saving, and print a summary at exit")
+    parser.add_argument("--profile-dump", metavar="FILE",
+                        help="With --profile, also write cProfile stats to FILE for pstats or snakeviz")
+    parser.add_argument("--check", action="store_true",
+                        help="Check every blow against blow_methods.txt and blow_effects.txt")
     args = parser.parse_args()
+    if args.diff and len(args.diff) > 2:
+        parser.error("--diff takes one or two backup ids")
+    if args.profile or args.profile_dump:
+        profiler = Profiler(args.profile_dump)
+        profiler.start()
     
     try:
-        if args.test:
+        if args.backups:
+            backups = BackupStore().list()
+            if not backups:
+                print("No backups yet")
+            for backup in backups:
+                print(f"{backup['id']}  {backup['time']}  {backup['size']:>9} bytes  "
+                      f"{backup['stored']}/{backup['records']} records stored")
+        elif args.restore:
+            previous = BackupStore().restore(args.restore, ANGBAND_MONSTER_FILE)
+            print(f"Restored monster.txt from backup {args.restore}")
+            print(f"The replaced version was backed up as {previous}")
+        elif args.diff:
+            sys.stdout.writelines(BackupStore().diff(args.diff[0], ANGBAND_MONSTER_FILE, *args.diff[1:]))
+        elif args.query is not None:
+            print_query(args.query)
+        elif args.flags is not None:
+            print_flag_query(args.flags)
+        elif args.stats:
+            print_stats(args.stats, args.by)
+        elif args.batch:
+            run_batch(args.batch, args.dry_run)
+        elif args.check:
+            print_check()
+        elif args.test:
             # Load monsters
-            monsters = parse_monster_file()
+            index = get_monster_index()
+            monsters = index.monsters
             # Find Blubbering idiot
-            blubbering_idiot = None
-            for monster in monsters:
-                if monster['name'].lower() == "blubbering idiot":
-                    blubbering_idiot = monster
-                    break
+            blubbering_idiot = index.get("Blubbering idiot")
             
             if blubbering_idiot:
                 # Make some test modifications
                 blubbering_idiot['speed'] = 140
                 blubbering_idiot['health'] = 200
-                blubbering_idiot['blows'] = ["CLAW:HURT:15d6", "BITE:POISON:2d6"]
+                blubbering_idiot['blows'] = [Blow('CLAW', 'HURT', '15d6'), Blow('BITE', 'POISON', '2d6')]
                 blubbering_idiot['flags'] = ["UNIQUE", "SMART", "EVIL"]
                 modified_monsters.add(blubbering_idiot['name'])
                 
@@ -1191,7 +2799,7 @@ def main():
                 backup_file, game_file = save_all_changes(monsters)
                 if backup_file and game_file:
                     print(f"\nTest changes made successfully!")
-                    print(f"Backup saved to: {os.path.basename(backup_file)}")
+                    print(f"Backup saved as: {backup_file} (undo with --restore {backup_file})")
                     print(f"Changes written to: {os.path.basename(game_file)}")
                     print("\nChanges made to Blubbering idiot:")
                     print("- Speed: 140")
@@ -1213,8 +2821,16 @@ def main():
                 
             # Use wrapper to handle terminal setup/cleanup
             curses.wrapper(curses_main)
+        if load_warnings and not args.check:
+            print(load_warning_summary(), file=sys.stderr)
     except Exception as e:
         print(f"Error: {type(e).__name__}: {str(e)}")
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            print('\n'.join(profiler.summary()), file=sys.stderr)
+            if args.profile_dump:
+                print(f"cProfile stats written to {args.profile_dump}", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -11,6 +11,40 @@ def create_app(test_config=None):
         SECRET_KEY="dev",
         # store the database in the instance folder
         DATABASE=os.path.join(app.instance_path, "flaskr.sqlite"),
+        # idle connections kept open between requests, and connections
+        # in use at once; a request waits this many seconds for one
+        # before it gets a 503
+        DATABASE_POOL_SIZE=5,
+        DATABASE_POOL_MAX_SIZE=20,
+        DATABASE_POOL_TIMEOUT=5,
+        # SQLite pragmas set on each connection, None keeps the default;
+        # WAL lets readers keep going while a write commits
+        SQLITE_JOURNAL_MODE="wal",
+        SQLITE_SYNCHRONOUS="normal",
+        SQLITE_MMAP_SIZE=256 * 1024 * 1024,
+        SQLITE_CACHE_SIZE=-16000,
+        SQLITE_TEMP_STORE="memory",
+        SQLITE_BUSY_TIMEOUT=5000,
+        # users cached for g.user, and for how many seconds
+        USER_CACHE_SIZE=1024,
+        USER_CACHE_TTL=300,
+        # rendered post articles, and whole index pages for anonymous
+        # visitors; the TTL bounds how stale other workers' copies get
+        FRAGMENT_CACHE_SIZE=4096,
+        FRAGMENT_CACHE_TTL=300,
+        PAGE_CACHE_SIZE=256,
+        PAGE_CACHE_TTL=60,
+        # password hashing cost, and the worker processes that run it;
+        # sign-ins beyond workers + queue size get a 503
+        PASSWORD_HASH_METHOD="scrypt:32768:8:1",
+        PASSWORD_SALT_LENGTH=16,
+        PASSWORD_HASH_WORKERS=2,
+        PASSWORD_HASH_QUEUE_SIZE=8,
+        # serve the blog and auth views as coroutines on aiosqlite,
+        # which needs the flask[async] and aiosqlite packages
+        ASYNC_VIEWS=False,
+        # number of posts shown on each page of the index
+        POSTS_PER_PAGE=20,
     )
 
     if test_config is None:
@@ -30,17 +64,29 @@ def create_app(test_config=None):
     def hello():
         return "Hello, World!"
 
-    # register the database commands
+    # register the caches, the password hasher and the database commands
+    from . import cache
     from . import db
+    from . import hashing
+
+    cache.init_app(app)
+    hashing.init_app(app)
 
     db.init_app(app)
 
     # apply the blueprints to the app
-    from . import auth
-    from . import blog
+    from . import api
+
+    if app.config["ASYNC_VIEWS"]:
+        from . import async_auth as auth
+        from . import async_blog as blog
+    else:
+        from . import auth
+        from . import blog
 
     app.register_blueprint(auth.bp)
     app.register_blueprint(blog.bp)
+    app.register_blueprint(api.bp)
 
     # make url_for('index') == url_for('blog.index')
     # in another app, you might define a separate main index here with
@@ -0,0 +1,130 @@
+import json
+
+from flask import Blueprint
+from flask import jsonify
+from flask import request
+from flask import Response
+from flask import stream_with_context
+from werkzeug.exceptions import abort
+from werkzeug.exceptions import HTTPException
+
+from .blog import get_post
+from .blog import get_posts_page
+from .db import get_db
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+#: Fields of a post that clients can ask for, and the column each reads.
+POST_FIELDS = {
+    "id": "p.id",
+    "title": "title",
+    "body": "body",
+    "created": "created",
+    "author_id": "author_id",
+    "username": "username",
+}
+
+#: Most posts returned by one page of the list endpoint.
+MAX_LIMIT = 100
+
+#: Rows fetched from the cursor at a time while exporting.
+EXPORT_BATCH_SIZE = 500
+
+
+@bp.errorhandler(HTTPException)
+def handle_error(e):
+    """Report errors from the API as JSON instead of HTML pages."""
+    response = jsonify(error=e.name, description=e.description)
+    response.status_code = e.code
+    return response
+
+
+def get_fields():
+    """Get the post fields selected with the ``fields`` query argument,
+    a comma separated list, defaulting to all of them.
+
+    :raise 400: if an unknown field is requested
+    """
+    value = request.args.get("fields")
+
+    if not value:
+        return list(POST_FIELDS)
+
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in POST_FIELDS]
+
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}.")
+
+    return fields
+
+
+def serialize_post(post, fields):
+    """Convert a post row to a JSON-compatible dict with the given
+    fields."""
+    data = {field: post[field] for field in fields}
+
+    if "created" in data:
+        data["created"] = data["created"].isoformat()
+
+    return data
+
+
+@bp.route("/posts")
+def list_posts():
+    """List a page of posts, most recent first.
+
+    Takes the same ``before`` and ``after`` cursors as the index page,
+    and returns the cursors of the neighbouring pages alongside the
+    posts.
+    """
+    fields = get_fields()
+    limit = min(max(1, request.args.get("limit", 20, type=int)), MAX_LIMIT)
+    posts, newer, older = get_posts_page(
+        before=request.args.get("before"),
+        after=request.args.get("after"),
+        limit=limit,
+    )
+    return jsonify(
+        posts=[serialize_post(post, fields) for post in posts],
+        newer=newer,
+        older=older,
+    )
+
+
+@bp.route("/posts/<int:id>")
+def get_post_json(id):
+    """Get a single post."""
+    return jsonify(serialize_post(get_post(id, check_author=False), get_fields()))
+
+
+@bp.route("/posts/export")
+def export_posts():
+    """Stream every post as newline-delimited JSON, most recent first.
+
+    Rows are read from the cursor in batches as the response is sent,
+    so memory use doesn't grow with the number of posts.
+    """
+    fields = get_fields()
+    columns = ", ".join(f"{POST_FIELDS[field]} AS {field}" for field in fields)
+    cursor = get_db().execute(
+        f"SELECT {columns} FROM post p JOIN user u ON p.author_id = u.id"
+        " ORDER BY p.created DESC, p.id DESC"
+    )
+
+    def generate():
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+
+            if not rows:
+                break
+
+            yield "".join(
+                json.dumps(serialize_post(row, fields)) + "\n" for row in rows
+            )
+
+    # keep the request, and with it the pooled connection, alive until
+    # the last row has been sent
+    return Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
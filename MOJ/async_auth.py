@@ -0,0 +1,148 @@
+import asyncio
+import functools
+import sqlite3
+
+from flask import Blueprint
+from flask import current_app
+from flask import flash
+from flask import g
+from flask import redirect
+from flask import render_template
+from flask import request
+from flask import session
+from flask import url_for
+
+from .cache import get_cache
+from .db import get_async_db
+
+bp = Blueprint("auth", __name__, url_prefix="/auth")
+
+
+def login_required(view):
+    """View decorator that redirects anonymous users to the login page."""
+
+    @functools.wraps(view)
+    async def wrapped_view(**kwargs):
+        if g.user is None:
+            return redirect(url_for("auth.login"))
+
+        return await view(**kwargs)
+
+    return wrapped_view
+
+
+async def get_user(id):
+    """Get a user by id through the user cache, like
+    :func:`MOJ.auth.get_user`.
+    """
+    cache = get_cache("user")
+    user = cache.get(id)
+
+    if user is None:
+        db = await get_async_db()
+
+        async with db.execute(
+            "SELECT id, username FROM user WHERE id = ?", (id,)
+        ) as cursor:
+            user = await cursor.fetchone()
+
+        if user is not None:
+            user = dict(user)
+            cache.set(id, user)
+
+    return user
+
+
+async def run_hasher(method, *args):
+    """Call a method of the app's password hasher on a thread, so the
+    event loop isn't blocked while the worker pool hashes."""
+    hasher = current_app.extensions["password_hasher"]
+    return await asyncio.to_thread(getattr(hasher, method), *args)
+
+
+@bp.before_app_request
+async def load_logged_in_user():
+    """If a user id is stored in the session, load the user object into
+    ``g.user``."""
+    user_id = session.get("user_id")
+
+    if user_id is None:
+        g.user = None
+    else:
+        g.user = await get_user(user_id)
+
+
+@bp.route("/register", methods=("GET", "POST"))
+async def register():
+    """Register a new user.
+
+    Validates that the username is not already taken. Hashes the
+    password for security.
+    """
+    if request.method == "POST":
+        username = request.form["username"]
+        password = request.form["password"]
+        error = None
+
+        if not username:
+            error = "Username is required."
+        elif not password:
+            error = "Password is required."
+
+        if error is None:
+            db = await get_async_db()
+
+            try:
+                await db.execute(
+                    "INSERT INTO user (username, password) VALUES (?, ?)",
+                    (username, await run_hasher("generate", password)),
+                )
+                await db.commit()
+            except sqlite3.IntegrityError:
+                # The username was already taken, which caused the
+                # commit to fail. Show a validation error.
+                error = f"User {username} is already registered."
+            else:
+                # Success, go to the login page.
+                return redirect(url_for("auth.login"))
+
+        flash(error)
+
+    return render_template("auth/register.html")
+
+
+@bp.route("/login", methods=("GET", "POST"))
+async def login():
+    """Log in a registered user by adding the user id to the session."""
+    if request.method == "POST":
+        username = request.form["username"]
+        password = request.form["password"]
+        db = await get_async_db()
+        error = None
+
+        async with db.execute(
+            "SELECT id, password FROM user WHERE username = ?", (username,)
+        ) as cursor:
+            user = await cursor.fetchone()
+
+        if user is None:
+            error = "Incorrect username."
+        elif not await run_hasher("check", user["password"], password):
+            error = "Incorrect password."
+
+        if error is None:
+            # store the user id in a new session and return to the index
+            session.clear()
+            session["user_id"] = user["id"]
+            return redirect(url_for("index"))
+
+        flash(error)
+
+    return render_template("auth/login.html")
+
+
+@bp.route("/logout")
+async def logout():
+    """Clear the current session, including the stored user id."""
+    session.clear()
+    return redirect(url_for("index"))
@@ -0,0 +1,147 @@
+from flask import Blueprint
+from flask import current_app
+from flask import flash
+from flask import g
+from flask import redirect
+from flask import render_template
+from flask import request
+from flask import url_for
+
+from .async_auth import login_required
+from .blog import _cached_index_page
+from .blog import _check_post
+from .blog import _index_response
+from .blog import _page_query
+from .blog import _page_response
+from .blog import _search_query
+from .blog import _search_response
+from .blog import invalidate_post
+from .cache import get_cache
+from .db import get_async_db
+
+bp = Blueprint("blog", __name__)
+
+
+async def fetchall(query, params=()):
+    """Run a query on the request's async connection and return all the
+    rows."""
+    db = await get_async_db()
+
+    async with db.execute(query, params) as cursor:
+        return await cursor.fetchall()
+
+
+@bp.route("/")
+async def index():
+    """Show a page of posts, most recent first."""
+    before = request.args.get("before")
+    after = request.args.get("after")
+    page = _cached_index_page(before, after)
+
+    if page is not None:
+        return _page_response(page)
+
+    limit = current_app.config["POSTS_PER_PAGE"]
+    rows = await fetchall(*_page_query(before, after, limit))
+    return _index_response(rows, before, after, limit)
+
+
+@bp.route("/search")
+async def search():
+    """Search the titles and bodies of posts, best matches first, with
+    the matching terms highlighted."""
+    terms = request.args.get("q", "").strip()
+    page = max(1, request.args.get("page", 1, type=int))
+    limit = current_app.config["POSTS_PER_PAGE"]
+    rows = []
+
+    if terms:
+        rows = await fetchall(*_search_query(terms, page, limit))
+
+    return _search_response(rows, terms, page, limit)
+
+
+async def get_post(id, check_author=True):
+    """Get a post and its author by id, like :func:`MOJ.blog.get_post`.
+
+    :raise 404: if a post with the given id doesn't exist
+    :raise 403: if the current user isn't the author
+    """
+    rows = await fetchall(
+        "SELECT p.id, title, body, created, author_id, username"
+        " FROM post p JOIN user u ON p.author_id = u.id"
+        " WHERE p.id = ?",
+        (id,),
+    )
+    return _check_post(rows[0] if rows else None, id, check_author)
+
+
+@bp.route("/create", methods=("GET", "POST"))
+@login_required
+async def create():
+    """Create a new post for the current user."""
+    if request.method == "POST":
+        title = request.form["title"]
+        body = request.form["body"]
+        error = None
+
+        if not title:
+            error = "Title is required."
+
+        if error is not None:
+            flash(error)
+        else:
+            db = await get_async_db()
+            await db.execute(
+                "INSERT INTO post (title, body, author_id) VALUES (?, ?, ?)",
+                (title, body, g.user["id"]),
+            )
+            await db.commit()
+            get_cache("page").invalidate("head")
+            return redirect(url_for("blog.index"))
+
+    return render_template("blog/create.html")
+
+
+@bp.route("/<int:id>/update", methods=("GET", "POST"))
+@login_required
+async def update(id):
+    """Update a post if the current user is the author."""
+    post = await get_post(id)
+
+    if request.method == "POST":
+        title = request.form["title"]
+        body = request.form["body"]
+        error = None
+
+        if not title:
+            error = "Title is required."
+
+        if error is not None:
+            flash(error)
+        else:
+            db = await get_async_db()
+            await db.execute(
+                "UPDATE post SET title = ?, body = ? WHERE id = ?", (title, body, id)
+            )
+            await db.commit()
+            invalidate_post(id)
+            return redirect(url_for("blog.index"))
+
+    return render_template("blog/update.html", post=post)
+
+
+@bp.route("/<int:id>/delete", methods=("POST",))
+@login_required
+async def delete(id):
+    """Delete a post.
+
+    Ensures that the post exists and that the logged in user is the
+    author of the post.
+    """
+    await get_post(id)
+    db = await get_async_db()
+    await db.execute("DELETE FROM post WHERE id = ?", (id,))
+    await db.commit()
+    invalidate_post(id)
+    return redirect(url_for("blog.index"))
@@ -8,10 +8,11 @@ from flask import render_template
 from flask import request
 from flask import session
 from flask import url_for
-from werkzeug.security import check_password_hash
-from werkzeug.security import generate_password_hash
 
+from .cache import get_cache
 from .db import get_db
+from .hashing import check_password
+from .hashing import hash_password
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -29,18 +30,44 @@ def login_required(view):
     return wrapped_view
 
 
+def get_user(id):
+    """Get a user by id, with only the columns that views need.
+
+    Users are kept in the app's user cache, so most requests don't
+    touch the database at all. A user's row never changes once it is
+    registered, and init-db clears the cache, so a cached user can't go
+    stale.
+
+    :param id: id of user to get
+    :return: the user, or ``None`` if there is no user with that id
+    """
+    cache = get_cache("user")
+    user = cache.get(id)
+
+    if user is None:
+        user = (
+            get_db()
+            .execute("SELECT id, username FROM user WHERE id = ?", (id,))
+            .fetchone()
+        )
+
+        if user is not None:
+            user = dict(user)
+            cache.set(id, user)
+
+    return user
+
+
 @bp.before_app_request
 def load_logged_in_user():
-    """If a user id is stored in the session, load the user object from
-    the database into ``g.user``."""
+    """If a user id is stored in the session, load the user object into
+    ``g.user``."""
     user_id = session.get("user_id")
 
     if user_id is None:
         g.user = None
     else:
-        g.user = (
-            get_db().execute("SELECT * FROM user WHERE id = ?", (user_id,)).fetchone()
-        )
+        g.user = get_user(user_id)
 
 
 @bp.route("/register", methods=("GET", "POST"))
@@ -65,7 +92,7 @@ def register():
             try:
                 db.execute(
                     "INSERT INTO user (username, password) VALUES (?, ?)",
-                    (username, generate_password_hash(password)),
+                    (username, hash_password(password)),
                 )
                 db.commit()
             except db.IntegrityError:
@@ -90,12 +117,12 @@ def login():
         db = get_db()
         error = None
         user = db.execute(
-            "SELECT * FROM user WHERE username = ?", (username,)
+            "SELECT id, password FROM user WHERE username = ?", (username,)
         ).fetchone()
 
         if user is None:
             error = "Incorrect username."
-        elif not check_password_hash(user["password"], password):
+        elif not check_password(user["password"], password):
             error = "Incorrect password."
 
         if error is None:
@@ -1,28 +1,313 @@
+import hashlib
+from datetime import datetime
+from datetime import timezone
+
 from flask import Blueprint
+from flask import current_app
 from flask import flash
 from flask import g
+from flask import make_response
 from flask import redirect
 from flask import render_template
 from flask import request
+from flask import session
 from flask import url_for
+from markupsafe import escape
+from markupsafe import Markup
 from werkzeug.exceptions import abort
 
 from .auth import login_required
+from .cache import get_cache
 from .db import get_db
 
 bp = Blueprint("blog", __name__)
 
 
-@bp.route("/")
-def index():
-    """Show all the posts, most recent first."""
-    db = get_db()
-    posts = db.execute(
+def encode_cursor(post):
+    """Build the page cursor that points at the given post."""
+    return f"{post['created']:%Y%m%d%H%M%S}-{post['id']}"
+
+
+def decode_cursor(value):
+    """Split a page cursor back into the ``(created, id)`` pair it was
+    built from.
+
+    :raise 400: if the cursor is malformed
+    """
+    created, _, id = value.partition("-")
+
+    try:
+        created = datetime.strptime(created, "%Y%m%d%H%M%S")
+        id = int(id)
+    except ValueError:
+        abort(400, f"Invalid page cursor {value!r}.")
+
+    return created.strftime("%Y-%m-%d %H:%M:%S"), id
+
+
+def _page_query(before=None, after=None, limit=20):
+    """Build the keyset query for one page of posts.
+
+    One row past ``limit`` is requested so the caller can tell whether
+    another page follows without a separate count.
+
+    :return: the SQL and its parameters; with ``after`` the rows come
+        back oldest first
+    """
+    query = (
         "SELECT p.id, title, body, created, author_id, username"
         " FROM post p JOIN user u ON p.author_id = u.id"
-        " ORDER BY created DESC"
-    ).fetchall()
-    return render_template("blog/index.html", posts=posts)
+    )
+
+    if after is not None:
+        return (
+            query + " WHERE (p.created, p.id) > (?, ?)"
+            " ORDER BY p.created, p.id LIMIT ?",
+            (*decode_cursor(after), limit + 1),
+        )
+
+    if before is not None:
+        query += " WHERE (p.created, p.id) < (?, ?)"
+        params = (*decode_cursor(before), limit + 1)
+    else:
+        params = (limit + 1,)
+
+    return query + " ORDER BY p.created DESC, p.id DESC LIMIT ?", params
+
+
+def _paginate(rows, before=None, after=None, limit=20):
+    """Trim the look-ahead row off a page and work out the cursors of
+    the neighbouring pages.
+
+    :return: ``(posts, newer, older)``, where ``newer`` and ``older``
+        are ``None`` at either end of the history
+    """
+    has_more = len(rows) > limit
+    posts = rows[:limit]
+
+    if after is not None:
+        posts.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = before is not None, has_more
+
+    if not posts:
+        return posts, None, None
+
+    newer = encode_cursor(posts[0]) if has_newer else None
+    older = encode_cursor(posts[-1]) if has_older else None
+    return posts, newer, older
+
+
+def get_posts_page(before=None, after=None, limit=None):
+    """Get one page of posts, most recent first.
+
+    Pages are addressed by a ``(created, id)`` cursor instead of an
+    offset, so each page reads only the rows it shows through the
+    ``post_created_id`` index, however far back in the history it is.
+
+    :param before: cursor of a post; return the posts older than it
+    :param after: cursor of a post; return the posts newer than it
+    :param limit: maximum number of posts on the page, defaults to the
+        ``POSTS_PER_PAGE`` config value
+    :return: ``(posts, newer, older)`` with the cursors of the adjacent
+        pages, or ``None`` where there is no such page
+    """
+    if limit is None:
+        limit = current_app.config["POSTS_PER_PAGE"]
+
+    query, params = _page_query(before, after, limit)
+    rows = get_db().execute(query, params).fetchall()
+    return _paginate(rows, before, after, limit)
+
+
+def render_post(post):
+    """Render the article for one post, reusing the cached fragment if
+    the post hasn't changed since it was last rendered.
+
+    The fragment only differs by whether the current user may edit the
+    post, so that is part of the cache key.
+    """
+    editable = g.user is not None and g.user["id"] == post["author_id"]
+    key = ("post", post["id"], editable)
+    cache = get_cache("fragment")
+    html = cache.get(key)
+
+    if html is None:
+        html = Markup(render_template("blog/_post.html", post=post, editable=editable))
+        cache.set(key, html, tags=[("post", post["id"])])
+
+    return html
+
+
+def invalidate_post(id):
+    """Drop the cached fragments and pages that show a post. Call this
+    after the post is changed or deleted.
+    """
+    get_cache("fragment").invalidate(("post", id))
+    get_cache("page").invalidate(("post", id))
+
+
+def _is_shared_page():
+    """Whether the current visitor sees the same pages as every other
+    anonymous visitor, so they can be served from the page cache."""
+    return g.user is None and not session.get("_flashes")
+
+
+def _cached_index_page(before=None, after=None):
+    """Get a page of the index from the page cache, if the visitor can
+    be served from it and the page is there."""
+    if not _is_shared_page():
+        return None
+
+    return get_cache("page").get(("index", before, after))
+
+
+def _page_response(page):
+    """Respond with a cached page, or with 304 Not Modified if the
+    client's copy is still current."""
+    html, etag, last_modified = page
+    response = make_response(html)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _index_response(rows, before=None, after=None, limit=20):
+    """Render a page of the index from the rows of its keyset query,
+    caching it if it can be shared between anonymous visitors.
+
+    The cached page is tagged with every post it read and with
+    ``"head"`` if it is the newest page, so that changing a post or
+    adding one drops exactly the pages affected.
+    """
+    # the look-ahead row decides whether there is another page, so the
+    # page depends on that post too
+    tags = [("post", row["id"]) for row in rows]
+    posts, newer, older = _paginate(rows, before, after, limit)
+
+    # rendering pops the flashed messages, so decide before rendering
+    # whether this visitor sees the shared page
+    shared = _is_shared_page()
+
+    if newer is None:
+        # a new post would show up on this page
+        tags.append("head")
+
+    html = render_template(
+        "blog/index.html",
+        articles=[render_post(post) for post in posts],
+        newer=newer,
+        older=older,
+    )
+
+    if not shared:
+        return html
+
+    page = (html, hashlib.sha1(html.encode()).hexdigest(), datetime.now(timezone.utc))
+    get_cache("page").set(("index", before, after), page, tags=tags)
+    return _page_response(page)
+
+
+@bp.route("/")
+def index():
+    """Show a page of posts, most recent first.
+
+    Anonymous visitors all see the same page, so it is served from the
+    page cache and can be revalidated with its ETag or Last-Modified.
+    """
+    before = request.args.get("before")
+    after = request.args.get("after")
+    page = _cached_index_page(before, after)
+
+    if page is not None:
+        return _page_response(page)
+
+    limit = current_app.config["POSTS_PER_PAGE"]
+    query, params = _page_query(before, after, limit)
+    rows = get_db().execute(query, params).fetchall()
+    return _index_response(rows, before, after, limit)
+
+
+#: Markers that FTS5 puts around matched terms. They can't occur in
+#: form input, so they are swapped for markup after escaping the text.
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+
+def _match_query(terms):
+    """Turn search box input into an FTS5 query that matches posts
+    containing every word, treating each word as a literal string so
+    that FTS5 operators and syntax errors can't come from user input.
+    """
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in terms.split())
+
+
+def _highlight(text):
+    """Escape text returned by FTS5 and mark up the matched terms."""
+    return (
+        escape(text)
+        .replace(_MATCH_START, Markup("<mark>"))
+        .replace(_MATCH_END, Markup("</mark>"))
+    )
+
+
+def _search_query(terms, page=1, limit=20):
+    """Build the query for one page of search results.
+
+    :return: the SQL and its parameters
+    """
+    return (
+        "SELECT p.id, created, author_id, username,"
+        " highlight(post_fts, 0, :start, :end) AS title,"
+        " snippet(post_fts, 1, :start, :end, '...', 32) AS snippet"
+        " FROM post_fts"
+        " JOIN post p ON p.id = post_fts.rowid"
+        " JOIN user u ON p.author_id = u.id"
+        " WHERE post_fts MATCH :query"
+        # a match in the title counts for more than one in the body
+        " ORDER BY bm25(post_fts, 10.0, 1.0)"
+        " LIMIT :limit OFFSET :offset",
+        {
+            "start": _MATCH_START,
+            "end": _MATCH_END,
+            "query": _match_query(terms),
+            "limit": limit + 1,
+            "offset": (page - 1) * limit,
+        },
+    )
+
+
+def _search_response(rows, terms, page=1, limit=20):
+    """Render a page of search results from the rows of its query."""
+    results = [
+        {**row, "title": _highlight(row["title"]), "snippet": _highlight(row["snippet"])}
+        for row in rows[:limit]
+    ]
+    return render_template(
+        "blog/search.html",
+        q=terms,
+        results=results,
+        prev_page=page - 1 if page > 1 else None,
+        next_page=page + 1 if len(rows) > limit else None,
+    )
+
+
+@bp.route("/search")
+def search():
+    """Search the titles and bodies of posts, best matches first, with
+    the matching terms highlighted."""
+    terms = request.args.get("q", "").strip()
+    page = max(1, request.args.get("page", 1, type=int))
+    limit = current_app.config["POSTS_PER_PAGE"]
+    rows = []
+
+    if terms:
+        query, params = _search_query(terms, page, limit)
+        rows = get_db().execute(query, params).fetchall()
+
+    return _search_response(rows, terms, page, limit)
 
 
 def get_post(id, check_author=True):
@@ -47,7 +332,16 @@ def get_post(id, check_author=True):
         )
         .fetchone()
     )
+    return _check_post(post, id, check_author)
+
 
+def _check_post(post, id, check_author=True):
+    """Check the result of looking up a post for :func:`get_post`.
+
+    :raise 404: if no post was found
+    :raise 403: if ``check_author`` is set and the current user isn't
+        the author
+    """
     if post is None:
         abort(404, f"Post id {id} doesn't exist.")
 
@@ -78,6 +372,7 @@ def create():
                 (title, body, g.user["id"]),
             )
             db.commit()
+            get_cache("page").invalidate("head")
             return redirect(url_for("blog.index"))
 
     return render_template("blog/create.html")
@@ -105,6 +400,7 @@ def update(id):
                 "UPDATE post SET title = ?, body = ? WHERE id = ?", (title, body, id)
             )
             db.commit()
+            invalidate_post(id)
             return redirect(url_for("blog.index"))
 
     return render_template("blog/update.html", post=post)
@@ -122,4 +418,5 @@ def delete(id):
     db = get_db()
     db.execute("DELETE FROM post WHERE id = ?", (id,))
     db.commit()
+    invalidate_post(id)
     return redirect(url_for("blog.index"))
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class LRUCache:
+    """A thread-safe, size-bounded cache that evicts the least recently
+    used entry first and can expire entries after a time to live.
+
+    :param maxsize: maximum number of entries to keep
+    :param ttl: seconds an entry stays valid, or ``None`` to keep
+        entries until they are evicted or invalidated
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Get the value stored for a key, or ``default`` if it is
+        missing or has expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is not None and (
+                entry[1] is None or entry[1] > time.monotonic()
+            ):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if entry is not None:
+                self._remove(key)
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if the
+        cache is full.
+        """
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        """Store a value and evict down to ``maxsize``. The lock must be
+        held.
+        """
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        """Drop an entry. The lock must be held."""
+        self._data.pop(key, None)
+
+    def delete(self, key):
+        """Drop the entry for a key, if there is one."""
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return the hit, miss and eviction counters and the current
+        size, for tuning ``maxsize`` and ``ttl``.
+        """
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class TaggedCache(LRUCache):
+    """An :class:`LRUCache` whose entries can be labelled with tags, so
+    that everything that depends on a piece of data can be dropped at
+    once when that data changes.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        super().__init__(maxsize, ttl)
+        self._tags = {}
+        self._key_tags = {}
+
+    def set(self, key, value, tags=()):
+        """Store a value under a key and label it with the given tags."""
+        with self._lock:
+            # forget the tags of the value being replaced, if any
+            self._remove(key)
+            self._key_tags[key] = tags = frozenset(tags)
+
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            self._store(key, value)
+
+    def _remove(self, key):
+        super()._remove(key)
+
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            keys.discard(key)
+
+            if not keys:
+                del self._tags[tag]
+
+    def invalidate(self, tag):
+        """Drop every entry labelled with the given tag."""
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._key_tags.clear()
+
+
+def get_cache(name):
+    """Get one of the current application's caches by name."""
+    return current_app.extensions["caches"][name]
+
+
+def clear_caches():
+    """Drop every entry from every cache of the current application."""
+    for cache in current_app.extensions["caches"].values():
+        cache.clear()
+
+
+def init_app(app):
+    """Create the application's caches. This is called by the
+    application factory.
+    """
+    app.extensions["caches"] = {
+        "user": LRUCache(app.config["USER_CACHE_SIZE"], app.config["USER_CACHE_TTL"]),
+        "fragment": TaggedCache(
+            app.config["FRAGMENT_CACHE_SIZE"], app.config["FRAGMENT_CACHE_TTL"]
+        ),
+        "page": TaggedCache(app.config["PAGE_CACHE_SIZE"], app.config["PAGE_CACHE_TTL"]),
+    }
@@ -1,9 +1,219 @@
+import queue
+import re
 import sqlite3
+import threading
 from datetime import datetime
 
 import click
 from flask import current_app
 from flask import g
+from werkzeug.exceptions import ServiceUnavailable
+
+from .cache import clear_caches
+
+
+#: Pragmas applied to every connection, in order, and the config key
+#: that sets each one. busy_timeout comes first so the others wait for
+#: locks instead of failing.
+PRAGMAS = (
+    ("busy_timeout", "SQLITE_BUSY_TIMEOUT"),
+    ("journal_mode", "SQLITE_JOURNAL_MODE"),
+    ("synchronous", "SQLITE_SYNCHRONOUS"),
+    ("mmap_size", "SQLITE_MMAP_SIZE"),
+    ("cache_size", "SQLITE_CACHE_SIZE"),
+    ("temp_store", "SQLITE_TEMP_STORE"),
+)
+
+
+def get_pragmas(config):
+    """Collect the pragma profile from the app config. Pragmas whose
+    config value is ``None`` are left at SQLite's default.
+
+    :raise ValueError: if a value is neither an integer nor a keyword
+    """
+    pragmas = {}
+
+    for pragma, key in PRAGMAS:
+        value = config.get(key)
+
+        if value is None:
+            continue
+
+        # values are formatted into the statement, so only allow the
+        # integers and keywords that SQLite pragmas actually take
+        if not isinstance(value, int) and not re.fullmatch(r"\w+", str(value)):
+            raise ValueError(f"Invalid value {value!r} for {key}.")
+
+        pragmas[pragma] = value
+
+    return pragmas
+
+
+def apply_pragmas(db, pragmas):
+    """Run the given pragmas on a connection."""
+    for pragma, value in pragmas.items():
+        db.execute(f"PRAGMA {pragma} = {value}").fetchall()
+
+
+def connect(database, pragmas=None):
+    """Open a new connection to the given database file, returning rows
+    that can be accessed like mappings.
+    """
+    # pooled connections are handed between the server's threads, but
+    # only ever used by one request at a time
+    db = sqlite3.connect(
+        database, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+    )
+    db.row_factory = sqlite3.Row
+
+    if pragmas:
+        apply_pragmas(db, pragmas)
+
+    return db
+
+
+class ConnectionPool:
+    """A pool of long-lived connections to one SQLite database.
+
+    Connections are checked out for the length of a request and put
+    back afterwards, so requests don't pay for opening and closing the
+    database every time. At most ``size`` idle connections are kept;
+    when they are all in use a new connection is opened rather than
+    making the request wait, and it is closed again when returned to a
+    full pool.
+
+    At most ``max_size`` connections may be checked out at once. A
+    request beyond that waits up to ``timeout`` seconds for one to be
+    returned, and is then refused with a 503 instead of opening ever
+    more connections under load.
+
+    :param database: path of the database file
+    :param size: maximum number of idle connections to keep open
+    :param pragmas: pragmas to apply to each new connection
+    :param max_size: maximum number of connections checked out at once
+    :param timeout: seconds to wait for a connection when all
+        ``max_size`` are in use
+    """
+
+    def __init__(self, database, size=5, pragmas=None, max_size=20, timeout=5):
+        self.database = database
+        self.size = size
+        self.pragmas = pragmas or {}
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=min(size, max_size))
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("opened", "closed", "reused", "discarded", "in_use", "rejected"), 0
+        )
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def _is_healthy(self, db):
+        """Check that a connection can still run a query and isn't left
+        in the middle of a transaction.
+        """
+        try:
+            if db.in_transaction:
+                db.rollback()
+
+            db.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+
+        return True
+
+    def _close(self, db):
+        self._count("closed")
+
+        try:
+            db.close()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self):
+        """Check out a connection, reusing an idle one if a healthy one
+        is available.
+
+        :raise 503: if ``max_size`` connections stay in use for longer
+            than ``timeout``
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("rejected")
+            raise ServiceUnavailable(
+                "The database is busy, try again shortly.", retry_after=1
+            )
+
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                try:
+                    db = connect(self.database, self.pragmas)
+                except BaseException:
+                    self._slots.release()
+                    raise
+
+                self._count("opened")
+                break
+
+            if self._is_healthy(db):
+                self._count("reused")
+                break
+
+            self._count("discarded")
+            self._close(db)
+
+        self._count("in_use")
+        return db
+
+    def release(self, db):
+        """Return a connection to the pool, closing it instead if the
+        pool is already full. Its health is checked when it is next
+        checked out.
+        """
+        self._count("in_use", -1)
+        self._slots.release()
+
+        try:
+            # an idle connection must not hold on to a transaction's locks
+            if db.in_transaction:
+                db.rollback()
+
+            self._idle.put_nowait(db)
+        except sqlite3.Error:
+            self._count("discarded")
+            self._close(db)
+        except queue.Full:
+            self._close(db)
+
+    def close(self):
+        """Close every idle connection in the pool."""
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            self._close(db)
+
+    def stats(self):
+        """Return counters describing how the pool has been used."""
+        with self._lock:
+            stats = dict(self._stats)
+
+        stats["idle"] = self._idle.qsize()
+        stats["size"] = self.size
+        stats["max_size"] = self.max_size
+        return stats
+
+
+def get_pool():
+    """Get the connection pool of the current application."""
+    return current_app.extensions["db_pool"]
 
 
 def get_db():
@@ -12,22 +222,59 @@ def get_db():
     again.
     """
     if "db" not in g:
-        g.db = sqlite3.connect(
-            current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        g.db = get_pool().acquire()
 
     return g.db
 
 
 def close_db(e=None):
-    """If this request connected to the database, close the
-    connection.
+    """If this request connected to the database, return the
+    connection to the pool.
     """
     db = g.pop("db", None)
 
     if db is not None:
-        db.close()
+        get_pool().release(db)
+
+
+async def get_async_db():
+    """Async counterpart of :func:`get_db`, used by the views when the
+    app runs with ``ASYNC_VIEWS``. Queries run on aiosqlite's thread
+    and return the same mapping-like rows. The connection is unique for
+    each request and closed again at teardown.
+
+    aiosqlite is an optional dependency, only needed in async mode.
+    """
+    if "async_db" not in g:
+        try:
+            import aiosqlite
+        except ImportError as e:
+            raise RuntimeError(
+                "ASYNC_VIEWS requires aiosqlite, install it with"
+                " 'pip install aiosqlite'."
+            ) from e
+
+        db = await aiosqlite.connect(
+            current_app.config["DATABASE"], detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        db.row_factory = sqlite3.Row
+
+        for pragma, value in get_pool().pragmas.items():
+            await db.execute(f"PRAGMA {pragma} = {value}")
+
+        g.async_db = db
+
+    return g.async_db
+
+
+async def close_async_db(e=None):
+    """If this request connected to the database asynchronously, close
+    the connection.
+    """
+    db = g.pop("async_db", None)
+
+    if db is not None:
+        await db.close()
 
 
 def init_db():
@@ -37,6 +284,33 @@ def init_db():
     with current_app.open_resource("schema.sql") as f:
         db.executescript(f.read().decode("utf8"))
 
+    create_search_index(db)
+
+    # cached rows refer to the data that was just dropped
+    clear_caches()
+
+    # the journal mode persists in the database file, so make sure a
+    # newly initialized database starts out with the configured profile
+    apply_pragmas(db, get_pool().pragmas)
+
+
+def create_search_index(db):
+    """Create the full-text search table and the triggers that keep it in
+    step with posts, unless they already exist.
+    """
+    with current_app.open_resource("search.sql") as f:
+        db.executescript(f.read().decode("utf8"))
+
+
+def rebuild_search_index():
+    """Rebuild the full-text search index from the posts table, creating
+    it first if the database predates search.
+    """
+    db = get_db()
+    create_search_index(db)
+    db.execute("INSERT INTO post_fts (post_fts) VALUES ('rebuild')")
+    db.commit()
+
 
 @click.command("init-db")
 def init_db_command():
@@ -45,6 +319,13 @@ def init_db_command():
     click.echo("Initialized the database.")
 
 
+@click.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Index all existing posts for full-text search."""
+    rebuild_search_index()
+    click.echo("Rebuilt the search index.")
+
+
 sqlite3.register_converter("timestamp", lambda v: datetime.fromisoformat(v.decode()))
 
 
@@ -52,5 +333,17 @@ def init_app(app):
     """Register database functions with the Flask app. This is called by
     the application factory.
     """
+    app.extensions["db_pool"] = ConnectionPool(
+        app.config["DATABASE"],
+        size=app.config["DATABASE_POOL_SIZE"],
+        pragmas=get_pragmas(app.config),
+        max_size=app.config["DATABASE_POOL_MAX_SIZE"],
+        timeout=app.config["DATABASE_POOL_TIMEOUT"],
+    )
     app.teardown_appcontext(close_db)
+
+    if app.config["ASYNC_VIEWS"]:
+        app.teardown_appcontext(close_async_db)
+
     app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_search_index_command)
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash
+from werkzeug.security import generate_password_hash
+
+
+class LatencyStats:
+    """Latency figures for one kind of call, over its most recent
+    ``window`` calls.
+    """
+
+    def __init__(self, window=1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        """Return the call count and the mean, p50, p95, p99 and max
+        latency of the recent calls, in milliseconds.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+
+        if not samples:
+            return {"count": count}
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+        return {
+            "count": count,
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": samples[-1] * 1000,
+        }
+
+
+class PasswordHasher:
+    """Hashes and checks passwords in a pool of worker processes, so the
+    deliberately slow hashing doesn't stall the other requests served
+    by the same worker.
+
+    At most ``workers + queue_size`` calls may be running or waiting at
+    once. Further calls are refused with a 503 instead of piling up
+    behind a burst of logins.
+
+    :param method: hash method and cost parameters passed to
+        :func:`~werkzeug.security.generate_password_hash`
+    :param salt_length: length of the generated salts
+    :param workers: number of worker processes, or 0 to hash on the
+        request thread
+    :param queue_size: number of calls allowed to wait for a worker
+    """
+
+    def __init__(self, method, salt_length=16, workers=2, queue_size=8):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, workers) + queue_size)
+        self.rejected = 0
+        self.latency = {"generate": LatencyStats(), "check": LatencyStats()}
+
+    def _get_executor(self):
+        # start the processes on first use rather than at import time,
+        # so forking servers don't inherit an already running pool
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+            return self._executor
+
+    def _run(self, name, func, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise ServiceUnavailable(
+                "Too many sign-ins in progress, try again shortly.", retry_after=1
+            )
+
+        start = time.perf_counter()
+
+        try:
+            if self.workers:
+                return self._get_executor().submit(func, *args).result()
+
+            return func(*args)
+        finally:
+            self._slots.release()
+            self.latency[name].record(time.perf_counter() - start)
+
+    def generate(self, password):
+        """Hash a password for storing.
+
+        :raise 503: if the pool is saturated
+        """
+        return self._run(
+            "generate", generate_password_hash, password, self.method, self.salt_length
+        )
+
+    def check(self, pwhash, password):
+        """Check a password against a stored hash.
+
+        :raise 503: if the pool is saturated
+        """
+        return self._run("check", check_password_hash, pwhash, password)
+
+    def stats(self):
+        """Return the latency summaries and the number of refused calls."""
+        return {
+            "generate": self.latency["generate"].summary(),
+            "check": self.latency["check"].summary(),
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        """Stop the worker processes, if they were started."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+def hash_password(password):
+    """Hash a password with the current application's hasher."""
+    return current_app.extensions["password_hasher"].generate(password)
+
+
+def check_password(pwhash, password):
+    """Check a password with the current application's hasher."""
+    return current_app.extensions["password_hasher"].check(pwhash, password)
+
+
+def init_app(app):
+    """Create the application's password hasher. This is called by the
+    application factory.
+    """
+    app.extensions["password_hasher"] = PasswordHasher(
+        app.config["PASSWORD_HASH_METHOD"],
+        salt_length=app.config["PASSWORD_SALT_LENGTH"],
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        queue_size=app.config["PASSWORD_HASH_QUEUE_SIZE"],
+    )
@@ -1,6 +1,7 @@
 -- Initialize the database.
 -- Drop any existing data and create empty tables.
 
+DROP TABLE IF EXISTS post_fts;
 DROP TABLE IF EXISTS user;
 DROP TABLE IF EXISTS post;
 
@@ -18,3 +19,6 @@ CREATE TABLE post (
   body TEXT NOT NULL,
   FOREIGN KEY (author_id) REFERENCES user (id)
 );
+
+-- Keyset pagination on the index walks posts by (created, id).
+CREATE INDEX post_created_id ON post (created, id);
@@ -0,0 +1,384 @@
+"""Measure how the monster editor's parse, search and save scale with
+the size of monster.txt.
+
+For each of ``--sizes`` a synthetic monster file with that many records
+is written to a temporary directory, with a mix of blows, flags, spells
+and descriptions like Angband's own, and ``edit_monsters`` is pointed
+at it. Each phase reports its time and throughput:
+
+* ``parse``: parsing the file without the parse cache
+* ``parse_cached``: loading the same monsters from the parse cache
+* ``index``: building the name and flag indexes
+* ``search``: substring searches of the names, with p50/p95 latency
+* ``flag_query``: boolean flag queries on the flag index
+* ``save``: editing ``--edits`` monsters and saving them, backup
+  included; the saved file is parsed again to check the edits
+
+Peak memory of parsing and saving is measured with tracemalloc in
+separate passes, so tracing does not slow down the timed ones. A
+million records need a few GB of memory. Results are written to a JSON
+file so that runs can be compared with ``--baseline``. Run from the
+repository root::
+
+    python -m benchmarks.mfe_scale --sizes 1000,10000,100000
+    python -m benchmarks.mfe_scale --sizes 1000000 --baseline old.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "MFE"))
+
+import edit_monsters  # noqa: E402
+
+PHASES = ("parse", "parse_cached", "index", "search", "flag_query", "save")
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+METHODS = ("HIT", "BITE", "CLAW", "TOUCH", "STING", "GAZE", "CRUSH", "ENGULF", "BEG")
+
+EFFECTS = ("HURT", "POISON", "TERRIFY", "EAT_GOLD", "FIRE", "COLD", "ACID", "CONFUSE")
+
+FLAGS = (
+    "UNIQUE", "MALE", "FEMALE", "EVIL", "ANIMAL", "ORC", "DRAGON", "UNDEAD",
+    "RAND_25", "RAND_50", "NEVER_MOVE", "SMART", "DROP_1", "DROP_60", "ONLY_GOLD",
+    "OPEN_DOOR", "BASH_DOOR", "IM_FIRE", "IM_COLD", "IM_POIS", "NO_CONF", "NO_SLEEP",
+)
+
+ADJECTIVES = ("Grey", "Cave", "Hill", "Black", "Giant", "Ancient", "Young", "Great")
+
+NOUNS = ("orc", "spider", "rat", "dragon", "mold", "wolf", "troll", "wight")
+
+FLAG_QUERIES = (
+    "UNIQUE",
+    "EVIL and not NEVER_MOVE",
+    "(UNIQUE or SMART) and not ANIMAL",
+    "DRAGON and (IM_FIRE or IM_COLD) and not UNIQUE",
+)
+
+
+def generate_monster_file(directory, records, seed=0):
+    """Write monster.txt and the blow files for ``records`` monsters to
+    ``directory``.
+
+    :return: the size of monster.txt in bytes
+    """
+    rng = random.Random(seed)
+    path = os.path.join(directory, "monster.txt")
+
+    with open(path, "w") as f:
+        f.write("# File: monster.txt\n\n# Synthetic monsters for benchmarks\n\n")
+
+        for i in range(records):
+            f.write(
+                f"name:{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}\n"
+                f"base:{rng.choice(NOUNS)}\nglyph:o\ncolor:U\n"
+                f"speed:{rng.randint(100, 140)}\nhit-points:{rng.randint(1, 3000)}\n"
+                "hearing:20\narmor:16\nsleepiness:30\n"
+                f"depth:{rng.randint(1, 100)}\nrarity:{rng.randint(1, 4)}\n"
+                f"power:{rng.randint(1, 50)}\nexperience:{rng.randint(1, 5000)}\n"
+            )
+
+            for _ in range(rng.randint(0, 4)):
+                method = rng.choice(METHODS)
+
+                if method == "BEG":
+                    f.write("blow:BEG\n")
+                else:
+                    f.write(
+                        f"blow:{method}:{rng.choice(EFFECTS)}:"
+                        f"{rng.randint(1, 12)}d{rng.randint(2, 12)}\n"
+                    )
+
+            flags = rng.sample(FLAGS, rng.randint(1, 8))
+
+            for start in range(0, len(flags), 4):
+                f.write(f"flags:{' | '.join(flags[start:start + 4])}\n")
+
+            if rng.random() < 0.3:
+                f.write(
+                    f"spell-power:{rng.randint(1, 60)}\n"
+                    "innate-freq:10\nspell-freq:5\nspells:BLINK | SCARE | CONF\n"
+                )
+
+            f.write(f"desc:Synthetic monster number {i}, which is rather \n")
+            f.write("desc:more dangerous than it looks.\n\n")
+
+    for name, entries in (("blow_methods.txt", METHODS), ("blow_effects.txt", EFFECTS)):
+        with open(os.path.join(directory, name), "w") as f:
+            for entry in entries:
+                f.write(f"name:{entry}\ndesc:{entry.lower()}\n\n")
+
+    return os.path.getsize(path)
+
+
+def use_directory(directory):
+    """Point edit_monsters at the files in ``directory`` and forget
+    everything it loaded from files of an earlier size."""
+    edit_monsters.ANGBAND_MONSTER_FILE = os.path.join(directory, "monster.txt")
+    edit_monsters.BLOW_METHODS_FILE = os.path.join(directory, "blow_methods.txt")
+    edit_monsters.BLOW_EFFECTS_FILE = os.path.join(directory, "blow_effects.txt")
+    edit_monsters.BACKUP_DIR = os.path.join(directory, ".monster_backups")
+    edit_monsters.monster_index = None
+    edit_monsters.monster_table = None
+    edit_monsters.modified_monsters.clear()
+    edit_monsters.monster_versions.clear()
+    edit_monsters.detail_cache.clear()
+    edit_monsters.flag_sets.clear()
+
+
+def timed(func, *args):
+    """Call ``func`` and return its result and the seconds it took."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(func, *args):
+    """Call ``func`` with tracemalloc running and return the peak memory
+    it allocated, in MB."""
+    tracemalloc.start()
+
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def latencies(func, queries):
+    """Run ``func`` on each query and return its latency percentiles in
+    milliseconds and the number of results of the last query."""
+    samples = []
+    results = None
+
+    for query in queries:
+        results, seconds = timed(func, query)
+        samples.append(seconds)
+
+    samples.sort()
+    return {
+        "queries": len(samples),
+        "queries_per_sec": len(samples) / sum(samples),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "results": len(results),
+    }
+
+
+def search_terms(rng, count):
+    """Return name searches: common words, rare numbers and misses."""
+    terms = []
+
+    for _ in range(count):
+        kind = rng.random()
+
+        if kind < 0.5:
+            terms.append(rng.choice(NOUNS))
+        elif kind < 0.9:
+            terms.append(f"{rng.choice(NOUNS)} {rng.randint(1, 999)}")
+        else:
+            terms.append("no such monster")
+
+    return terms
+
+
+def edit(monsters, rng, count):
+    """Change the speed of ``count`` monsters and give half of them a new
+    blow, marking them modified.
+
+    :return: the expected speed of each edited monster, by name
+    """
+    expected = {}
+
+    for monster in rng.sample(monsters, min(count, len(monsters))):
+        monster["speed"] = monster.get("speed", 110) + 1
+
+        if len(expected) % 2:
+            monster["blows"] = monster.get("blows", []) + [
+                edit_monsters.Blow("HIT", "HURT", "1d1")
+            ]
+
+        edit_monsters.modified_monsters.add(monster["name"])
+        expected[monster["name"]] = monster["speed"]
+
+    return expected
+
+
+def save(monsters):
+    backup_id, path = edit_monsters.save_all_changes(monsters)
+
+    if path is None:
+        raise RuntimeError("save_all_changes failed")
+
+
+def run_size(records, args):
+    """Generate a file of ``records`` monsters and run every phase on it."""
+    rng = random.Random(args.seed)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        size = generate_monster_file(tmp, records, args.seed)
+        use_directory(tmp)
+        path = edit_monsters.ANGBAND_MONSTER_FILE
+        megabytes = size / 2**20
+
+        monsters, seconds = timed(edit_monsters.parse_monster_file, path, False)
+        results["parse"] = {
+            "seconds": seconds,
+            "records_per_sec": records / seconds,
+            "mb_per_sec": megabytes / seconds,
+            "peak_mb": peak_memory(edit_monsters.parse_monster_file, path, False),
+        }
+
+        edit_monsters.save_parse_cache(path, monsters)
+        cached, seconds = timed(edit_monsters.load_parse_cache, path)
+
+        if cached is None:
+            raise RuntimeError("the parse cache was not used")
+
+        results["parse_cached"] = {
+            "seconds": seconds,
+            "records_per_sec": records / seconds,
+        }
+        del cached
+
+        index, seconds = timed(edit_monsters.MonsterIndex, monsters)
+        edit_monsters.monster_index = index
+        results["index"] = {"seconds": seconds, "records_per_sec": records / seconds}
+        results["search"] = latencies(index.search, search_terms(rng, args.searches))
+        results["flag_query"] = latencies(
+            index.flags.query, FLAG_QUERIES * (args.searches // len(FLAG_QUERIES) or 1)
+        )
+
+        expected = edit(monsters, rng, args.edits)
+        _, seconds = timed(save, monsters)
+        results["save"] = {
+            "seconds": seconds,
+            "edits": len(expected),
+            "mb_per_sec": megabytes / seconds,
+        }
+
+        saved = {
+            monster["name"]: monster.get("speed")
+            for monster in edit_monsters.parse_monster_file(path, False)
+            if monster["name"] in expected
+        }
+
+        if saved != expected:
+            raise RuntimeError("the saved file does not have the edits")
+
+        edit(monsters, rng, args.edits)
+        results["save"]["peak_mb"] = peak_memory(save, monsters)
+
+    results["file_mb"] = megabytes
+    return results
+
+
+def git_revision():
+    """Return the current commit, to tell runs apart, if git knows it."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def headline(phase, r):
+    """Return the number a phase is compared by, lower is better, and
+    how to show it."""
+    if "p50_ms" in r:
+        return r["p50_ms"], f"p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms"
+
+    text = f"{r['seconds'] * 1000:10.1f} ms"
+
+    if "records_per_sec" in r:
+        text += f"  {r['records_per_sec']:12,.0f} records/s"
+
+    if "peak_mb" in r:
+        text += f"  peak {r['peak_mb']:8.1f} MB"
+
+    return r["seconds"], text
+
+
+def print_results(results, baseline=None):
+    """Print a table of results, with the change from a baseline run
+    where it has the same size and phase."""
+    for records, phases in results.items():
+        print(f"{int(records):,} monsters ({phases['file_mb']:.1f} MB):")
+
+        for phase in PHASES:
+            value, line = headline(phase, phases[phase])
+            old = (baseline or {}).get(records, {}).get(phase)
+
+            if old:
+                line += f"  ({value / headline(phase, old)[0] - 1:+.0%})"
+
+            print(f"  {phase:>12}: {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MFE parse, search and save benchmark")
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[1000, 10000, 100000],
+        help="comma separated record counts, e.g. 1000,10000,100000,1000000",
+    )
+    parser.add_argument("--searches", type=int, default=200, help="per size")
+    parser.add_argument("--edits", type=int, default=10, help="monsters edited per save")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file, default: a new file")
+    parser.add_argument("--baseline", help="JSON results file to compare with")
+    args = parser.parse_args()
+
+    started = datetime.datetime.now(datetime.timezone.utc)
+    results = {}
+
+    for records in args.sizes:
+        results[str(records)] = run_size(records, args)
+
+    baseline = None
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    print_results(results, baseline)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"mfe_scale_{started:%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "started": started.isoformat(),
+                "revision": git_revision(),
+                "args": vars(args),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
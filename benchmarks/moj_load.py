@@ -0,0 +1,359 @@
+"""Load test MOJ over HTTP with many concurrent clients.
+
+The app is built with ``create_app(test_config)`` on a temporary
+database seeded with ``--users`` users and ``--posts`` posts, and
+served by werkzeug's threaded server. Each client logs in as its own
+user and the endpoints are driven one after another, so every phase
+reports its own throughput and p50/p95/p99 latency:
+
+* ``index``: the first page of posts, as an anonymous visitor
+* ``index_user``: the same page as a logged-in user
+* ``get_post``: a post's edit page, which looks the post up
+* ``create``, ``update``, ``delete``: the post forms
+* ``login``: a full login, including the password check
+
+Results are written to a JSON file so that runs can be compared over
+time with ``--baseline``. Run from the repository root::
+
+    python -m benchmarks.moj_load --clients 32 --requests 2000
+    python -m benchmarks.moj_load --modes sync,async --baseline old.json
+"""
+import argparse
+import datetime
+import http.cookiejar
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from MOJ import create_app
+from MOJ.db import get_db
+from MOJ.db import init_db
+
+ENDPOINTS = ("index", "index_user", "get_post", "create", "update", "delete", "login")
+
+PASSWORD = "bench"
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def make_app(database, users, posts, **config):
+    """Create an app on a fresh database seeded with ``users`` users,
+    who all have the password :data:`PASSWORD`, and ``posts`` posts
+    shared out between them in turn.
+    """
+    app = create_app({"TESTING": True, "DATABASE": database, **config})
+    # hashing once is enough, and keeps seeding fast at any scale
+    pwhash = generate_password_hash(PASSWORD, app.config["PASSWORD_HASH_METHOD"])
+
+    with app.app_context():
+        init_db()
+        db = get_db()
+        db.executemany(
+            "INSERT INTO user (username, password) VALUES (?, ?)",
+            ((f"user{i}", pwhash) for i in range(1, users + 1)),
+        )
+        db.executemany(
+            "INSERT INTO post (title, body, author_id) VALUES (?, ?, ?)",
+            (
+                (f"post {i}", f"lorem ipsum {i} " * 20, i % users + 1)
+                for i in range(posts)
+            ),
+        )
+        db.commit()
+
+    return app
+
+
+def serve(app):
+    """Serve the app on a free local port from a background thread."""
+    # the per-request access log would swamp the results
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects instead of following them, so that a form post
+    is timed on its own and not together with the page it leads to."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """A simulated user with its own session cookie.
+
+    :param base_url: URL the app is served at
+    :param user_id: id of the seeded user to log in as
+    :param users: number of seeded users, to find this user's posts
+    """
+
+    def __init__(self, base_url, user_id, users):
+        self.base_url = base_url
+        self.username = f"user{user_id}"
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect,
+        )
+        # seeded post i has id i + 1 and belongs to user i % users + 1,
+        # so this user's posts are every users-th id from user_id on
+        self._post_ids = iter(range(user_id, 10**12, users))
+        self._post_id = next(self._post_ids)
+
+    def request(self, path, data=None):
+        """Send a request and return the HTTP status."""
+        if data is not None:
+            data = urllib.parse.urlencode(data).encode()
+
+        try:
+            with self._opener.open(self.base_url + path, data) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def login(self):
+        return self.request(
+            "/auth/login", {"username": self.username, "password": PASSWORD}
+        )
+
+    def index(self):
+        return self.request("/")
+
+    def get_post(self):
+        return self.request(f"/{self._post_id}/update")
+
+    def create(self):
+        return self.request("/create", {"title": "created", "body": "lorem ipsum"})
+
+    def update(self):
+        return self.request(
+            f"/{self._post_id}/update", {"title": "updated", "body": "lorem ipsum"}
+        )
+
+    def delete(self):
+        # every delete needs a post of its own that is still there
+        status = self.request(f"/{self._post_id}/delete", {})
+        self._post_id = next(self._post_ids)
+        return status
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run_phase(clients, action, requests):
+    """Have the clients perform ``requests`` actions between them, each
+    client one at a time.
+
+    :return: throughput, latency percentiles in milliseconds and the
+        number of requests that failed
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    per_client = [requests // len(clients)] * len(clients)
+
+    for i in range(requests % len(clients)):
+        per_client[i] += 1
+
+    def work(client, count):
+        nonlocal errors
+        samples = []
+        failed = 0
+
+        for _ in range(count):
+            start = time.perf_counter()
+            status = action(client)
+            samples.append(time.perf_counter() - start)
+            failed += status >= 400
+
+        with lock:
+            latencies.extend(samples)
+            errors += failed
+
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(len(clients)) as executor:
+        list(executor.map(work, clients, per_client))
+
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    return {
+        "requests": len(latencies),
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+    }
+
+
+def run(app, args):
+    """Serve the app and drive each endpoint in turn."""
+    server = serve(app)
+    base_url = f"http://127.0.0.1:{server.port}"
+    anonymous = [Client(base_url, i + 1, args.users) for i in range(args.clients)]
+    clients = [Client(base_url, i + 1, args.users) for i in range(args.clients)]
+    results = {}
+
+    try:
+        for client in clients:
+            client.login()
+
+        actions = {
+            "index": (anonymous, Client.index),
+            "index_user": (clients, Client.index),
+            "get_post": (clients, Client.get_post),
+            "create": (clients, Client.create),
+            "update": (clients, Client.update),
+            "delete": (clients, Client.delete),
+            "login": (clients, Client.login),
+        }
+
+        for endpoint in args.endpoints:
+            phase_clients, action = actions[endpoint]
+            results[endpoint] = run_phase(phase_clients, action, args.requests)
+    finally:
+        server.shutdown()
+        app.extensions["db_pool"].close()
+        app.extensions["password_hasher"].shutdown()
+
+    return results
+
+
+def git_revision():
+    """Return the current commit, to tell runs apart, if git knows it."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    """Print a table of results, with the change from a baseline run
+    where it has the same mode and endpoint."""
+    for mode, endpoints in results.items():
+        print(f"{mode}:")
+
+        for endpoint, r in endpoints.items():
+            line = (
+                f"  {endpoint:>10}: {r['requests_per_sec']:8.1f} req/s"
+                f"  p50 {r['p50_ms']:7.1f}  p95 {r['p95_ms']:7.1f}"
+                f"  p99 {r['p99_ms']:7.1f} ms  {r['errors']} errors"
+            )
+            old = (baseline or {}).get(mode, {}).get(endpoint)
+
+            if old:
+                line += (
+                    f"  ({r['requests_per_sec'] / old['requests_per_sec'] - 1:+.0%}"
+                    f" req/s, {r['p99_ms'] / old['p99_ms'] - 1:+.0%} p99)"
+                )
+
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MOJ load test")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="per endpoint")
+    parser.add_argument("--users", type=int, default=None, help="default: clients")
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument(
+        "--endpoints",
+        type=lambda value: value.split(","),
+        default=list(ENDPOINTS),
+        help=f"comma separated subset of {','.join(ENDPOINTS)}",
+    )
+    parser.add_argument(
+        "--modes",
+        type=lambda value: value.split(","),
+        default=["sync"],
+        help="comma separated list of sync and async",
+    )
+    parser.add_argument(
+        "--config",
+        type=json.loads,
+        default={},
+        help="JSON object of extra app config, e.g. '{\"PAGE_CACHE_SIZE\": 0}'",
+    )
+    parser.add_argument("--output", help="JSON results file, default: a new file")
+    parser.add_argument("--baseline", help="JSON results file to compare with")
+    args = parser.parse_args()
+
+    args.users = args.users or args.clients
+    unknown = (set(args.endpoints) - set(ENDPOINTS)) | (
+        set(args.modes) - {"sync", "async"}
+    )
+
+    if unknown:
+        parser.error(f"unknown endpoints or modes: {', '.join(sorted(unknown))}")
+
+    if args.users < args.clients:
+        parser.error("each client needs its own user, so --users >= --clients")
+
+    # each client deletes one of its user's posts per delete request
+    if args.posts < args.users * (args.requests // args.clients + 2):
+        parser.error("not enough --posts for the delete phase")
+
+    started = datetime.datetime.now(datetime.timezone.utc)
+    results = {}
+
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(
+                os.path.join(tmp, "bench.sqlite"),
+                args.users,
+                args.posts,
+                ASYNC_VIEWS=mode == "async",
+                **args.config,
+            )
+            results[mode] = run(app, args)
+
+    baseline = None
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    print_results(results, baseline)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"moj_load_{started:%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "started": started.isoformat(),
+                "revision": git_revision(),
+                "args": vars(args),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Compare concurrent read/write throughput of the MOJ database with
+SQLite's default rollback journal and with the tuned pragma profile.
+
+Readers run the index page query while writers insert and commit
+posts, each inside its own app context the way a request would. Run
+from the repository root::
+
+    python -m benchmarks.moj_pragmas --readers 8 --writers 2 --seconds 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from MOJ import create_app
+from MOJ.blog import get_posts_page
+from MOJ.db import get_db
+from MOJ.db import init_db
+
+#: SQLite's own defaults, i.e. the behaviour before the pragma profile.
+ROLLBACK_PROFILE = {
+    "SQLITE_JOURNAL_MODE": "delete",
+    "SQLITE_SYNCHRONOUS": "full",
+    "SQLITE_MMAP_SIZE": None,
+    "SQLITE_CACHE_SIZE": None,
+    "SQLITE_TEMP_STORE": None,
+    "SQLITE_BUSY_TIMEOUT": None,
+}
+
+#: The profile configured by ``create_app``.
+TUNED_PROFILE = {}
+
+
+def make_app(database, profile, posts):
+    """Create an app on a fresh database seeded with one user and the
+    given number of posts.
+    """
+    app = create_app({"TESTING": True, "DATABASE": database, **profile})
+
+    with app.app_context():
+        init_db()
+        db = get_db()
+        db.execute("INSERT INTO user (username, password) VALUES ('bench', '')")
+        db.executemany(
+            "INSERT INTO post (title, body, author_id) VALUES (?, ?, 1)",
+            ((f"post {i}", "lorem ipsum " * 20) for i in range(posts)),
+        )
+        db.commit()
+
+    return app
+
+
+def read(app):
+    with app.app_context():
+        get_posts_page()
+
+
+def write(app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, author_id) VALUES (?, ?, 1)",
+            ("written", "lorem ipsum"),
+        )
+        db.commit()
+
+
+def run(app, readers, writers, seconds):
+    """Run readers and writers against the app for the given time and
+    return the operations per second each side managed.
+    """
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(op, stat):
+        done = errors = 0
+
+        while time.perf_counter() < deadline:
+            try:
+                op(app)
+            except Exception:
+                errors += 1
+            else:
+                done += 1
+
+        with lock:
+            counts[stat] += done
+            counts["errors"] += errors
+
+    threads = [
+        threading.Thread(target=worker, args=(read, "reads")) for _ in range(readers)
+    ]
+    threads += [
+        threading.Thread(target=worker, args=(write, "writes"))
+        for _ in range(writers)
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    app.extensions["db_pool"].close()
+    return {
+        "reads_per_sec": counts["reads"] / seconds,
+        "writes_per_sec": counts["writes"] / seconds,
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MOJ SQLite pragma benchmark")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+
+    for name, profile in (("rollback", ROLLBACK_PROFILE), ("tuned", TUNED_PROFILE)):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(os.path.join(tmp, "bench.sqlite"), profile, args.posts)
+            results[name] = run(app, args.readers, args.writers, args.seconds)
+
+        print(
+            f"{name:>8}: {results[name]['reads_per_sec']:10.1f} reads/s"
+            f"  {results[name]['writes_per_sec']:8.1f} writes/s"
+            f"  {results[name]['errors']} errors"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
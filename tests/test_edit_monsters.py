@@ -0,0 +1,118 @@
+"""Tests for the MFE monster editor.
+
+The details view needs a real terminal, so those tests run it in a child
+process on a pseudo-terminal and feed it keys with ``curses.ungetch``.
+"""
+
+import os
+import pty
+import sys
+import textwrap
+
+import pytest
+
+MFE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "MFE")
+
+sys.path.insert(0, MFE_DIR)
+
+import edit_monsters  # noqa: E402
+
+MONSTER_FILE = """\
+name:Cave mold
+speed:110
+hit-points:28
+experience:3
+blow:SPORE:HURT:1d6
+flags:NEVER_MOVE | IM_POIS
+desc:A strange growth on the dungeon floor.
+"""
+
+# Run in the child: open the details of the first monster, feed it keys
+# and write "ok" to the result file if the view returned normally
+DETAILS_SCRIPT = textwrap.dedent(
+    """\
+    import curses, os, sys
+    sys.path.insert(0, {mfe_dir!r})
+    import edit_monsters
+
+    directory, keys, result = sys.argv[1:4]
+    edit_monsters.ANGBAND_MONSTER_FILE = os.path.join(directory, "monster.txt")
+    edit_monsters.BLOW_METHODS_FILE = os.path.join(directory, "blow_methods.txt")
+    edit_monsters.BLOW_EFFECTS_FILE = os.path.join(directory, "blow_effects.txt")
+    monster = edit_monsters.parse_monster_file(use_cache=False)[0]
+
+    def run(stdscr):
+        edit_monsters.init_curses()
+        # ungetch pushes onto the front of the input queue
+        for key in reversed(keys):
+            curses.ungetch(key)
+        height, width = stdscr.getmaxyx()
+        edit_monsters.show_monster_details(stdscr, monster, height, width)
+
+    try:
+        curses.wrapper(run)
+    except Exception as e:
+        outcome = f"{{type(e).__name__}}: {{e}}"
+    else:
+        outcome = "ok"
+    with open(result, "w") as file:
+        file.write(outcome)
+    """
+).format(mfe_dir=MFE_DIR)
+
+
+def run_details(tmp_path, keys):
+    """Open the details view of the Cave mold on a 24x80 pseudo-terminal,
+    press ``keys`` and return what the child reported."""
+    (tmp_path / "monster.txt").write_text(MONSTER_FILE)
+    (tmp_path / "blow_methods.txt").write_text("name:SPORE\n\nname:CLAW\n")
+    (tmp_path / "blow_effects.txt").write_text("name:HURT\n")
+    result = tmp_path / "result.txt"
+
+    pid, fd = pty.fork()
+
+    if pid == 0:
+        os.environ.update(TERM="xterm", LINES="24", COLUMNS="80")
+        os.execv(
+            sys.executable,
+            [sys.executable, "-c", DETAILS_SCRIPT, str(tmp_path), keys, str(result)],
+        )
+
+    # drain the child's screen output until it exits
+    while True:
+        try:
+            if not os.read(fd, 65536):
+                break
+        except OSError:
+            break
+
+    os.waitpid(pid, 0)
+    os.close(fd)
+    return result.read_text() if result.exists() else "no result"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs a pseudo-terminal")
+def test_details_after_adding_blow(tmp_path):
+    """Adding a blow adds a content line; walking down to the last line
+    afterwards must use the new layout of the pad."""
+    # j to Blows:, e opens the blow editor, a adds a blow, q leaves it,
+    # then j past the end and q to close the details
+    keys = "jjje" + "aclaw hurt 1d6\n" + "q" + "j" * 20 + "q"
+    assert run_details(tmp_path, keys) == "ok"
+
+
+
+@pytest.mark.parametrize(
+    ("content", "message"),
+    [
+        ('{"name": "Cave mold"}', "expected a list of objects"),
+        ('["speed=3"]', 'entry 1: expected an object, not "speed=3"'),
+        ('[{"name": "Cave mold", "speed": "+=1"}, 3]', "entry 2: expected an object, not 3"),
+    ],
+)
+def test_json_batch_entries_must_be_objects(tmp_path, content, message):
+    path = tmp_path / "batch.json"
+    path.write_text(content)
+
+    with pytest.raises(ValueError, match=message):
+        edit_monsters.load_batch_file(str(path))